@@ -0,0 +1,97 @@
+"""Bring an existing database up to the current schema.
+
+    python -m app.backfill [--force]
+
+Creates the app search index (FTS5 table and triggers, or the MySQL FULLTEXT
+index) when the apps table predates it, and fills it from the existing rows.
+Adds the parsed semver columns (major, minor, patch, is_release,
+prerelease_key) to tables created before they existed and rebuilds
+ix_versions_latest on them. Every row's columns are then recomputed from its
+semver string.
+Recomputing only happens when the schema had to change, or with --force.
+Snapshots and the catalog index are then rebuilt where configured. Safe to
+re-run.
+"""
+from sqlalchemy import bindparam, inspect, select, update
+from sqlalchemy.engine import Engine
+from app.catalog import bump_revision
+from app.importer import rebuild_static
+from app.models import Version, semver_columns
+from app.search import upgrade_search_index
+import logging
+import sys
+
+BATCH_SIZE = 5_000
+_DEFAULTS = {"major": "0", "minor": "0", "patch": "0", "is_release": "1", "prerelease_key": "''"}
+
+log = logging.getLogger("app.backfill")
+
+def upgrade_schema(conn) -> bool:
+    """Add missing columns and rebuild the ordering index; True if anything changed."""
+    table = Version.__table__
+    insp = inspect(conn)
+    columns = {c["name"] for c in insp.get_columns(table.name)}
+    missing = [name for name in _DEFAULTS if name not in columns]
+    if not missing:
+        return False
+    index = next(ix for ix in table.indexes if ix.name == "ix_versions_latest")
+    if index.name in {ix["name"] for ix in insp.get_indexes(table.name)}:
+        index.drop(conn)
+    for name in missing:
+        column_type = table.c[name].type.compile(dialect=conn.dialect)
+        conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {name} {column_type} "
+                             f"NOT NULL DEFAULT {_DEFAULTS[name]}")
+    index.create(conn)
+    return True
+
+def recompute(conn, batch_size: int = BATCH_SIZE) -> tuple[int, int]:
+    """Re-derive the semver columns of every row; returns (updated, unparsable)."""
+    stmt = (update(Version).where(Version.id == bindparam("_id"))
+            .values(major=bindparam("major"), minor=bindparam("minor"),
+                    patch=bindparam("patch"), is_release=bindparam("is_release"),
+                    prerelease_key=bindparam("prerelease_key")))
+    updated = bad = last_id = 0
+    while rows := conn.execute(select(Version.id, Version.semver).where(Version.id > last_id)
+                               .order_by(Version.id).limit(batch_size)).all():
+        last_id = rows[-1].id
+        params = []
+        for row in rows:
+            try:
+                major, minor, patch, is_release, pre_key = semver_columns(row.semver)
+            except ValueError:
+                # left at the defaults, so it sorts as a 0.0.0 release
+                log.warning("version %d: unparsable semver %r", row.id, row.semver)
+                bad += 1
+                continue
+            params.append({"_id": row.id, "major": major, "minor": minor, "patch": patch,
+                           "is_release": is_release, "prerelease_key": pre_key})
+        if params:
+            conn.execute(stmt, params)
+            updated += len(params)
+    return updated, bad
+
+def backfill(engine: Engine, force: bool = False) -> tuple[int, int]:
+    with engine.begin() as conn:
+        changed = upgrade_schema(conn)
+        if not (changed or force):
+            return 0, 0
+        result = recompute(conn)
+        # cached latest-version answers, snapshots and the index are all stale
+        bump_revision(conn)
+    return result
+
+def main(argv: list[str]):
+    from app.db import engine
+    logging.basicConfig(level=logging.INFO)
+    logging.getLogger("app.sql.slow").setLevel(logging.ERROR)
+    with engine.begin() as conn:
+        created = upgrade_search_index(conn)
+    print("search index: " + ("created" if created else "up to date"))
+    updated, bad = backfill(engine, force="--force" in argv)
+    print(f"versions: {updated} rows updated, {bad} unparsable")
+    if updated:
+        # release order may have changed for any app
+        rebuild_static()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,171 @@
+"""In-process response cache for app_detail and latest_version.
+
+A commit invalidates the affected entries in the worker that made it. Other
+workers learn about the change by reading the catalog revision from the
+primary, at most every CACHE_REVISION_CHECK seconds, and drop everything once
+it has moved. After any invalidation, fills read from the primary for
+DB_READ_YOUR_WRITES_SECONDS, because a replica may not have the write yet.
+An entry can therefore be stale for at most CACHE_REVISION_CHECK seconds,
+or for the TTL while the primary is unreachable.
+"""
+from collections import OrderedDict, defaultdict
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app.catalog import catalog_revision
+from app.db import READ_YOUR_WRITES_SECONDS, AsyncSessionLocal, async_engine, async_read_bind
+from app.models import App, Patch, Version
+import itertools
+import logging
+import os
+import threading
+import time
+
+CACHE_REVISION_CHECK = float(os.getenv("CACHE_REVISION_CHECK", "1"))
+
+log = logging.getLogger("app.cache")
+
+MISS = object()
+
+class ResponseCache:
+    """Bounded LRU with a TTL and tag-based invalidation.
+
+    Entries are tagged with ("slug", slug) and ("app", app_id) so a commit that
+    touches an App or Version row drops every response derived from it. Every
+    invalidation bumps a generation; a fill started under an older generation is
+    discarded so a read racing a publish cannot re-cache the stale row.
+    Entries belong to the catalog revision last passed to observe_revision;
+    a different revision empties the cache.
+    """
+    def __init__(self, maxsize: int, ttl: float, primary_window: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.primary_window = primary_window
+        self._data: OrderedDict = OrderedDict()  # key -> (expires, value, tags)
+        self._tags: defaultdict = defaultdict(set)
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.revision: int | None = None
+        self._primary_until = 0.0
+        self.hits = self.misses = self.evictions = self.revision_changes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._drop(key)
+                self.misses += 1
+                return MISS
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, tags=(), generation: int | None = None):
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._data:
+                self._drop(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, tags)
+            for tag in tags:
+                self._tags[tag].add(key)
+            while len(self._data) > self.maxsize:
+                self._drop(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        with self._lock:
+            self._bump()
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._bump()
+            self._data.clear()
+            self._tags.clear()
+
+    def observe_revision(self, revision: int):
+        with self._lock:
+            if revision == self.revision:
+                return
+            if self.revision is not None:
+                self.revision_changes += 1
+                self._bump()
+                self._data.clear()
+                self._tags.clear()
+            self.revision = revision
+
+    def fill_from_primary(self) -> bool:
+        return time.monotonic() < self._primary_until
+
+    def _bump(self):
+        self.generation += 1
+        self._primary_until = time.monotonic() + self.primary_window
+
+    def _drop(self, key):
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits,
+                "misses": self.misses, "evictions": self.evictions,
+                "revision_changes": self.revision_changes}
+
+response_cache = ResponseCache(maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "10000")),
+                               ttl=float(os.getenv("RESPONSE_CACHE_TTL", "60")),
+                               primary_window=READ_YOUR_WRITES_SECONDS)
+_next_revision_check = 0.0
+
+async def check_revision():
+    """Empty the cache if another worker changed the catalog since the last check."""
+    global _next_revision_check
+    now = time.monotonic()
+    if now < _next_revision_check:
+        return
+    # claimed before the await so concurrent requests don't all query
+    _next_revision_check = now + CACHE_REVISION_CHECK
+    try:
+        async with AsyncSessionLocal() as db:
+            revision = await catalog_revision(db)
+    except Exception:
+        # keep serving; entries still expire after the TTL
+        log.warning("catalog revision check failed", exc_info=True)
+        return
+    response_cache.observe_revision(revision)
+
+def fill_bind(request=None):
+    # a replica may not have the write behind a recent invalidation yet
+    return async_engine if response_cache.fill_from_primary() else async_read_bind(request)
+
+def app_tags(slug: str, app_id: int | None = None) -> tuple:
+    return (("slug", slug),) if app_id is None else (("slug", slug), ("app", app_id))
+
+@event.listens_for(Session, "after_flush")
+def _collect_cache_tags(session, flush_context):
+    tags = session.info.setdefault("cache_tags", set())
+    for obj in itertools.chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, App):
+            slugs = {obj.slug, *inspect(obj).attrs.slug.history.deleted}
+            tags.update(("slug", s) for s in slugs if s)
+            tags.add(("app", obj.id))
+        elif isinstance(obj, (Version, Patch)):
+            tags.add(("app", obj.app_id))
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_cache(session):
+    tags = session.info.pop("cache_tags", None)
+    if tags:
+        response_cache.invalidate(*tags)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_cache_tags(session):
+    session.info.pop("cache_tags", None)
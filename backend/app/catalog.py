@@ -0,0 +1,58 @@
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.models import App, CatalogRevision, Version
+import itertools
+import zlib
+
+@event.listens_for(Session, "after_flush")
+def _bump_revision(session, flush_context):
+    if session.info.get("revision_bumped"):
+        return
+    changed = itertools.chain(session.new, session.dirty, session.deleted)
+    if not any(isinstance(obj, (App, Version)) for obj in changed):
+        return
+    bump_revision(session.connection())
+    session.info["revision_bumped"] = True
+
+def bump_revision(conn):
+    bumped = conn.execute(update(CatalogRevision).where(CatalogRevision.id == 1)
+                          .values(value=CatalogRevision.value + 1))
+    if bumped.rowcount == 0:
+        conn.execute(insert(CatalogRevision).values(id=1, value=1))
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _reset_revision_flag(session):
+    session.info.pop("revision_bumped", None)
+
+async def catalog_revision(db: AsyncSession) -> int:
+    value = (await db.execute(select(CatalogRevision.value).where(CatalogRevision.id == 1))).scalar()
+    return value or 0
+
+def latest_releases():
+    # highest published release of every app on every platform, in one pass
+    ranked = (select(Version.id,
+                     func.row_number().over(partition_by=(Version.app_id, Version.platform),
+                                            order_by=Version.newest_first()).label("rank"))
+              .where(Version.published == True)  # noqa: E712
+              .subquery())
+    return (select(App.slug, Version.id, Version.semver, Version.platform, Version.file_url,
+                   Version.file_sha256, Version.release_notes)
+            .join(Version, Version.app_id == App.id)
+            .join(ranked, ranked.c.id == Version.id)
+            .where(ranked.c.rank == 1))
+
+def release_etag(v) -> str:
+    # unquoted; release notes can be edited in place, so they are folded in
+    return "v%d-%s-%08x" % (v.id, v.file_sha256, zlib.crc32(v.release_notes.encode()))
+
+def release_payload(v) -> dict:
+    """The latest_version body for a release; shared with the snapshot and index builders."""
+    return {
+        "semver": v.semver,
+        "platform": v.platform,
+        "file_url": v.file_url,
+        "file_sha256": v.file_sha256,
+        "release_notes": v.release_notes,
+    }
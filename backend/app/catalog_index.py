@@ -0,0 +1,287 @@
+"""Read-mostly catalog index shared by every worker through one mmapped file.
+
+The file holds ready-to-send bodies (and their ETags) for app_detail and for
+latest_version without ?from=, keyed by slug and (slug, platform). Workers map
+it read-only, so the pages live once in the page cache however many workers
+run; a lookup hashes the key, probes a fixed-size slot table in place and
+copies out only the matching record. Rebuilds write a new file and os.replace
+it over the old one; each worker notices the new inode on its next stat
+(at most every CATALOG_INDEX_CHECK seconds) and remaps. Lookups copy their
+record out, so the old mapping can be closed straight away.
+
+A publish re-renders only its app's records and copies the rest of the old
+file byte for byte (update_index); full builds run at startup when the file
+is missing or outdated, and from the CLI.
+
+Layout (little endian):
+    header   magic(8) revision(u64) nslots(u64)
+    slots    nslots x (hash u64, offset u64, length u64), hash 0 = empty
+    records  key_len(u16) key etag_len(u16) etag body
+
+    python -m app.catalog_index    # full rebuild
+"""
+from contextlib import contextmanager
+from sqlalchemy import select
+from sqlalchemy.orm import Session, joinedload
+from app.catalog import latest_releases, release_etag, release_payload
+from app.conditional import json_body, payload_etag
+from app.db import engine
+from app.models import App, CatalogRevision, User
+from app.schemas import AppDetail
+from app.snapshots import RebuildScheduler
+import fcntl
+import hashlib
+import itertools
+import logging
+import mmap
+import os
+import struct
+import time
+
+CATALOG_INDEX_PATH = os.getenv("CATALOG_INDEX_PATH", "")
+CATALOG_INDEX_DEBOUNCE = float(os.getenv("CATALOG_INDEX_DEBOUNCE", "1"))
+# how often a worker stats the file for a newer build
+CATALOG_INDEX_CHECK = float(os.getenv("CATALOG_INDEX_CHECK", "1"))
+
+MAGIC = b"EOXCIDX1"
+HEADER = struct.Struct("<8sQQ")
+SLOT = struct.Struct("<QQQ")
+U16 = struct.Struct("<H")
+
+log = logging.getLogger("app.catalog_index")
+
+def _hash(key: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+def app_key(slug: str) -> bytes:
+    return b"a\0" + slug.encode()
+
+def latest_key(slug: str, platform: str) -> bytes:
+    return b"l\0" + slug.encode() + b"\0" + platform.encode()
+
+def _records(db: Session, app_ids=None):
+    apps = select(App).options(joinedload(App.developer).load_only(User.id))
+    releases = latest_releases()
+    if app_ids is not None:
+        apps = apps.where(App.id.in_(app_ids))
+        releases = releases.where(App.id.in_(app_ids))
+    for app in db.scalars(apps.execution_options(yield_per=5000)):
+        payload = AppDetail.model_validate(app).model_dump()
+        yield app_key(app.slug), payload_etag(payload), json_body(payload)
+    for row in db.execute(releases.execution_options(yield_per=5000)):
+        yield latest_key(row.slug, row.platform), '"%s"' % release_etag(row), json_body(release_payload(row))
+
+def _record(key: bytes, etag: str, body: bytes) -> bytes:
+    etag = etag.encode()
+    return U16.pack(len(key)) + key + U16.pack(len(etag)) + etag + body
+
+def _write_file(path: str, revision: int, entries, chunks) -> int:
+    """entries: (hash, length) per record; chunks: the record bytes, same order."""
+    # power of two at under 50% load keeps linear probes short
+    nslots = 1 << max(4, (2 * len(entries)).bit_length())
+    slots = bytearray(nslots * SLOT.size)
+    offset = HEADER.size + len(slots)
+    for h, length in entries:
+        i = h & (nslots - 1)
+        while SLOT.unpack_from(slots, i * SLOT.size)[0]:
+            i = (i + 1) & (nslots - 1)
+        SLOT.pack_into(slots, i * SLOT.size, h, offset, length)
+        offset += length
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, revision, nslots))
+            f.write(slots)
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        # e.g. ENOSPC on a full tmpfs: don't leave half a file taking the space
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+    return len(entries)
+
+def write_index(path: str, revision: int, records) -> int:
+    blobs, entries = [], []
+    for key, etag, body in records:
+        blobs.append(_record(key, etag, body))
+        entries.append((_hash(key), len(blobs[-1])))
+    return _write_file(path, revision, entries, blobs)
+
+@contextmanager
+def _locked(path: str):
+    # workers share the file: builds and updates take turns, so an update
+    # never starts from a file another one is about to replace
+    with open(path + ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def _revision(db: Session) -> int:
+    # read before the records: a publish racing the build leaves the index
+    # looking older than it is, never newer
+    return db.scalar(select(CatalogRevision.value).where(CatalogRevision.id == 1)) or 0
+
+def _build(path: str) -> int:
+    start = time.perf_counter()
+    with Session(engine) as db:
+        revision = _revision(db)
+        count = write_index(path, revision, _records(db))
+    log.info("catalog index r%d: %d entries in %.1fs", revision, count, time.perf_counter() - start)
+    return revision
+
+def build_index(path: str = CATALOG_INDEX_PATH) -> int:
+    with _locked(path):
+        return _build(path)
+
+def update_index(app_ids, path: str = CATALOG_INDEX_PATH) -> int:
+    """Re-render the records of these apps; every other record is copied as raw bytes.
+
+    Publishing touches one app, so this avoids re-serializing the whole
+    catalog in the serving worker. Returns the number of records rendered.
+    """
+    start = time.perf_counter()
+    with _locked(path):
+        try:
+            f = open(path, "rb")
+        except FileNotFoundError:
+            # startup (ensure_index) or the CLI makes the first full build
+            log.warning("no catalog index at %s; skipping update", path)
+            return 0
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as old:
+            magic, _, nslots = HEADER.unpack_from(old)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a catalog index")
+            with Session(engine) as db:
+                revision = _revision(db)
+                fresh = [(key, _record(key, etag, body))
+                         for key, etag, body in _records(db, list(app_ids))]
+            # every record of a changed app is replaced, whatever its platforms
+            slugs = [key[2:] for key, _ in fresh if key.startswith(b"a\0")]
+            stale_apps = {app_key(s.decode()) for s in slugs}
+            stale_latest = tuple(b"l\0" + s + b"\0" for s in slugs)
+            kept = []
+            table = old[HEADER.size:HEADER.size + nslots * SLOT.size]
+            for h, offset, length in SLOT.iter_unpack(table):
+                if not h:
+                    continue
+                (klen,) = U16.unpack_from(old, offset)
+                key = old[offset + 2:offset + 2 + klen]
+                if key not in stale_apps and not key.startswith(stale_latest):
+                    kept.append((offset, h, length))
+            kept.sort()  # copy in file order
+            entries = [(h, length) for _, h, length in kept]
+            entries += [(_hash(key), len(blob)) for key, blob in fresh]
+            chunks = itertools.chain((old[o:o + n] for o, _, n in kept),
+                                     (blob for _, blob in fresh))
+            _write_file(path, revision, entries, chunks)
+    log.info("catalog index r%d: %d records updated, %d kept in %.2fs", revision, len(fresh),
+             len(kept), time.perf_counter() - start)
+    return len(fresh)
+
+def ensure_index(path: str = CATALOG_INDEX_PATH):
+    # startup: every worker calls this, only a missing or outdated file is
+    # rebuilt, and the lock makes the others wait for that one build
+    with _locked(path):
+        with Session(engine) as db:
+            revision = _revision(db)
+        try:
+            with open(path, "rb") as f:
+                magic, built, _ = HEADER.unpack(f.read(HEADER.size))
+            if magic == MAGIC and built == revision:
+                return
+        except (OSError, struct.error):
+            pass
+        try:
+            _build(path)
+        except OSError:
+            # an outdated index would keep serving old releases
+            if os.path.exists(path):
+                os.unlink(path)
+            raise
+
+class CatalogIndex:
+    def __init__(self, path: str, check_interval: float):
+        self.path = path
+        self.check_interval = check_interval
+        self.revision = None
+        self.hits = self.misses = self.reloads = 0
+        self._map = None
+        self._nslots = 0
+        self._identity = None
+        self._next_check = 0.0
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        self._next_check = now + self.check_interval
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            self._close()
+            return
+        identity = (st.st_dev, st.st_ino, st.st_mtime_ns)
+        if identity == self._identity:
+            return
+        with open(self.path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, revision, nslots = HEADER.unpack_from(mapped)
+        if magic != MAGIC:
+            mapped.close()
+            raise ValueError(f"{self.path} is not a catalog index")
+        self._close()
+        self._map, self.revision, self._nslots, self._identity = mapped, revision, nslots, identity
+        self.reloads += 1
+
+    def _close(self):
+        if self._map is not None:
+            self._map.close()
+        self._map, self.revision, self._nslots, self._identity = None, None, 0, None
+
+    def get(self, key: bytes) -> tuple[str, bytes] | None:
+        if not self.path:
+            return None
+        self._refresh()
+        mapped = self._map
+        if mapped is None:
+            return None
+        h = _hash(key)
+        i = h & (self._nslots - 1)
+        while True:
+            slot_hash, offset, length = SLOT.unpack_from(mapped, HEADER.size + i * SLOT.size)
+            if not slot_hash:
+                self.misses += 1
+                return None
+            if slot_hash == h:
+                (klen,) = U16.unpack_from(mapped, offset)
+                if mapped[offset + 2:offset + 2 + klen] == key:
+                    pos = offset + 2 + klen
+                    (elen,) = U16.unpack_from(mapped, pos)
+                    self.hits += 1
+                    return (mapped[pos + 2:pos + 2 + elen].decode(),
+                            mapped[pos + 2 + elen:offset + length])
+            i = (i + 1) & (self._nslots - 1)
+
+    def app(self, slug: str):
+        return self.get(app_key(slug))
+
+    def latest(self, slug: str, platform: str):
+        return self.get(latest_key(slug, platform))
+
+    def stats(self) -> dict:
+        return {"revision": self.revision, "hits": self.hits, "misses": self.misses,
+                "reloads": self.reloads}
+
+catalog_index = CatalogIndex(CATALOG_INDEX_PATH, CATALOG_INDEX_CHECK)
+index_scheduler = RebuildScheduler(CATALOG_INDEX_DEBOUNCE, build_index if CATALOG_INDEX_PATH else None,
+                                   update_index)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if not CATALOG_INDEX_PATH:
+        raise SystemExit("set CATALOG_INDEX_PATH")
+    build_index()
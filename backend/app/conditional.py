@@ -0,0 +1,35 @@
+from fastapi import Request, Response
+from app.responses import FastJSONResponse, dumps
+import hashlib
+import orjson
+
+def json_body(payload) -> bytes:
+    # byte-for-byte what FastJSONResponse renders, for bodies prepared ahead of time
+    return dumps(payload)
+
+def payload_etag(payload) -> str:
+    body = orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)
+    return '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so a W/ prefix still matches
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def etag_response(request: Request, etag: str, payload) -> Response:
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return FastJSONResponse(payload, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+def etag_body_response(request: Request, etag: str, body: bytes) -> Response:
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return Response(body, media_type="application/json",
+                    headers={"ETag": etag, "Cache-Control": "no-cache"})
@@ -1,14 +1,162 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from contextvars import ContextVar
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+import functools
+import itertools
+import logging
 import os
+import time
 
 DB_URL = os.getenv("DB_URL", "sqlite:///./appstore.db")
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {})
+# comma-separated read replicas, e.g. "sqlite:///./replica.db" locally
+DB_REPLICA_URLS = [u.strip() for u in os.getenv("DB_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_RETRY_SECONDS = float(os.getenv("DB_REPLICA_RETRY_SECONDS", "30"))
+READ_YOUR_WRITES_SECONDS = int(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "5"))
+PIN_COOKIE = "db_pin"
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+
+slow_query_log = logging.getLogger("app.sql.slow")
+
+def _connect_args(url: str) -> dict:
+    return {"check_same_thread": False} if url.startswith("sqlite") else {}
+
+engine = create_engine(DB_URL, connect_args=_connect_args(DB_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def get_db():
+_ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "mysql": "mysql+aiomysql", "mysql+pymysql": "mysql+aiomysql"}
+
+def async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return _ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+def _create_async_engine(url: str, **kw):
+    # aiosqlite defaults to NullPool (a new connection per session); pool it
+    # like every other backend so connections are reused and pool stats mean something
+    if url.startswith("sqlite") and ":memory:" not in url:
+        kw.setdefault("poolclass", AsyncAdaptedQueuePool)
+    return create_async_engine(url, **kw)
+
+ASYNC_DB_URL = os.getenv("ASYNC_DB_URL", async_url(DB_URL))
+async_engine = _create_async_engine(ASYNC_DB_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+class QueryStats:
+    """Queries issued while handling one request; see SQLTimingMiddleware."""
+    __slots__ = ("count", "total", "slowest", "slowest_statement")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = ""
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.slowest:
+            self.slowest, self.slowest_statement = elapsed, statement
+
+query_stats: ContextVar[QueryStats | None] = ContextVar("query_stats", default=None)
+
+def _param_shape(params, executemany: bool = False) -> str:
+    # types only: the slow log must not leak emails, hashes or tokens
+    if executemany:
+        return f"{len(params)} x {_param_shape(params[0])}" if params else "[]"
+    if isinstance(params, dict):
+        return "{%s}" % ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items())
+    if isinstance(params, (list, tuple)):
+        return "(%s)" % ", ".join(type(v).__name__ for v in params)
+    return type(params).__name__
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    stats = query_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_query_log.warning("%.1fms %s params=%s", elapsed * 1000, " ".join(statement.split()),
+                               _param_shape(parameters, executemany))
+
+class ReplicaSet:
+    """Round-robin over replica engines, skipping any that failed recently.
+
+    A replica that raises a disconnect or connect error is taken out of rotation
+    for REPLICA_RETRY_SECONDS; when none are healthy reads go to the primary.
+    """
+    def __init__(self, engines, primary):
+        self.engines = engines
+        self.primary = primary
+        self._down_until = [0.0] * len(engines)
+        self._next = itertools.count()
+        for i, e in enumerate(engines):
+            event.listen(e.sync_engine, "handle_error", functools.partial(self._on_error, i))
+
+    def _on_error(self, i, ctx):
+        if ctx.is_disconnect or ctx.connection is None:
+            self._down_until[i] = time.monotonic() + REPLICA_RETRY_SECONDS
+
+    def pick(self):
+        now = time.monotonic()
+        start = next(self._next)
+        for k in range(len(self.engines)):
+            i = (start + k) % len(self.engines)
+            if self._down_until[i] <= now:
+                return self.engines[i]
+        return self.primary
+
+async_replicas = ReplicaSet([_create_async_engine(async_url(u), pool_pre_ping=True)
+                             for u in DB_REPLICA_URLS], async_engine)
+
+# read-your-writes: a session that committed a write pins the client to the
+# primary for a short window through a cookie, so it holds across workers
+@event.listens_for(Session, "after_flush")
+def _mark_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(Session, "after_commit")
+def _pin_to_primary(session):
+    response = session.info.get("response")
+    if session.info.pop("wrote", False) and response is not None and READ_YOUR_WRITES_SECONDS > 0:
+        response.set_cookie(PIN_COOKIE, str(int(time.time()) + READ_YOUR_WRITES_SECONDS),
+                            max_age=READ_YOUR_WRITES_SECONDS, httponly=True)
+
+def pinned_to_primary(request: Request) -> bool:
+    # the cookie is client-controlled: a deadline further out than any pin we
+    # set is forged, and must not keep a client off the replicas for good
+    try:
+        until = float(request.cookies.get(PIN_COOKIE, 0))
+    except ValueError:
+        return False
+    now = time.time()
+    return now < until <= now + READ_YOUR_WRITES_SECONDS
+
+def get_db(response: Response):
     db = SessionLocal()
+    db.info["response"] = response
     try:
         yield db
     finally:
         db.close()
+
+async def get_async_db(response: Response):
+    async with AsyncSessionLocal() as db:
+        db.info["response"] = response
+        yield db
+
+def async_read_bind(request: Request | None = None):
+    if request is not None and pinned_to_primary(request):
+        return async_engine
+    return async_replicas.pick()
+
+async def get_async_read_db(request: Request):
+    async with AsyncSessionLocal(bind=async_read_bind(request)) as db:
+        yield db
@@ -0,0 +1,92 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import select
+from app.db import AsyncSessionLocal
+from app.models import Patch, Version
+from app.storage import artifact_path, commit_file, hash_file, temp_path
+import asyncio
+import bsdiff4
+import logging
+import os
+
+# patches are built against this many previous published releases
+DELTA_DEPTH = int(os.getenv("DELTA_DEPTH", "3"))
+DELTA_WORKERS = int(os.getenv("DELTA_WORKERS", "1"))
+# a patch is only kept when it is at most this fraction of the full artifact
+DELTA_MAX_RATIO = float(os.getenv("DELTA_MAX_RATIO", "0.8"))
+
+_pool: ProcessPoolExecutor | None = None
+
+log = logging.getLogger("app.deltas")
+
+def _executor() -> ProcessPoolExecutor:
+    # bsdiff is CPU-bound and holds the GIL, so it runs outside the API process
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=DELTA_WORKERS)
+    return _pool
+
+def _reset_executor():
+    # a worker that died takes the whole pool down; start a fresh one next time
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False)
+        _pool = None
+
+def _make_patch(old_sha256: str, new_sha256: str, max_size: float) -> tuple[str, int] | None:
+    # a patch too large to be worth serving never reaches the store
+    tmp = temp_path()
+    try:
+        bsdiff4.file_diff(artifact_path(old_sha256), artifact_path(new_sha256), tmp)
+        if os.path.getsize(tmp) > max_size:
+            os.unlink(tmp)
+            return None
+        sha256, size = hash_file(tmp)
+        commit_file(tmp, sha256)
+        return sha256, size
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+async def build_deltas(version_id: int):
+    """Precompute patches from the previous DELTA_DEPTH releases to this one."""
+    async with AsyncSessionLocal() as db:
+        v = await db.get(Version, version_id)
+        if not v or not v.published or not v.file_sha256:
+            return
+        target = artifact_path(v.file_sha256)
+        if not os.path.exists(target):
+            return
+        done = set((await db.execute(
+            select(Patch.from_version_id).where(Patch.to_version_id == v.id))).scalars())
+        previous = (await db.execute(
+            select(Version)
+            .where(Version.app_id == v.app_id,
+                   Version.platform == v.platform,
+                   Version.published == True,  # noqa: E712
+                   Version.file_sha256 != "",
+                   Version.older_than(v.semver))
+            .order_by(*Version.newest_first())
+            .limit(DELTA_DEPTH))).scalars().all()
+        loop = asyncio.get_running_loop()
+        max_size = os.path.getsize(target) * DELTA_MAX_RATIO
+        for old in previous:
+            if (old.id in done or old.file_sha256 == v.file_sha256
+                    or not os.path.exists(artifact_path(old.file_sha256))):
+                continue
+            # one bad pair must not cost the patches already built
+            try:
+                patch = await loop.run_in_executor(
+                    _executor(), _make_patch, old.file_sha256, v.file_sha256, max_size)
+            except Exception as e:
+                log.exception("delta %d -> %d failed", old.id, v.id)
+                if isinstance(e, BrokenProcessPool):
+                    _reset_executor()
+                continue
+            if patch is None:
+                continue
+            sha256, size = patch
+            db.add(Patch(app_id=v.app_id, from_version_id=old.id, to_version_id=v.id,
+                         sha256=sha256, size=size))
+        await db.commit()
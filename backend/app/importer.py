@@ -0,0 +1,153 @@
+"""Bulk catalog loader.
+
+    python -m app.importer users=users.csv apps=apps.ndjson versions=versions.ndjson
+
+Rows stream from NDJSON (.ndjson/.jsonl) or CSV files and are inserted with
+batched Core executemany in one transaction per table. On SQLite, secondary
+indexes and the FTS triggers are dropped for the load and rebuilt once at the
+end, which is far cheaper than maintaining them row by row. The CLI then
+rebuilds the static snapshots and the catalog index when they are configured.
+"""
+from sqlalchemy import Boolean, Integer, insert, select, text
+from sqlalchemy.engine import Engine
+from app.catalog import bump_revision
+from app.models import APPS_FTS_DDL, App, Base, Version, semver_columns
+from app.search import upgrade_search_index
+import csv
+import itertools
+import json
+import logging
+import sys
+import time
+
+BATCH_SIZE = 50_000
+_TRUE = {"1", "true", "t", "yes", "y"}
+
+def read_rows(path: str):
+    with open(path, newline="") as f:
+        if path.endswith((".ndjson", ".jsonl")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+def _coercer(table):
+    # CSV yields strings; NDJSON may too. Convert by declared column type.
+    casts = {}
+    for c in table.columns:
+        if isinstance(c.type, Boolean):
+            casts[c.name] = lambda v: v if isinstance(v, bool) else str(v).strip().lower() in _TRUE
+        elif isinstance(c.type, Integer):
+            casts[c.name] = int
+    def coerce(row: dict) -> dict:
+        return {k: (casts[k](v) if k in casts and v is not None and v != "" else v)
+                for k, v in row.items() if k in table.c}
+    return coerce
+
+def _version_rows(rows, slugs: dict):
+    # versions may reference their app by slug and need parsed semver columns
+    for row in rows:
+        if "app_id" not in row or row["app_id"] in ("", None):
+            row["app_id"] = slugs[row.pop("app_slug")]
+        major, minor, patch, is_release, pre_key = semver_columns(row["semver"])
+        row.update(major=major, minor=minor, patch=patch, is_release=is_release,
+                   prerelease_key=pre_key)
+        yield row
+
+def _defer_indexes(conn, table):
+    indexes = [ix for ix in table.indexes if ix.dialect_kwargs.get("mysql_prefix") is None]
+    for ix in indexes:
+        ix.drop(conn, checkfirst=True)
+    return indexes
+
+def load_table(conn, table, rows, batch_size: int = BATCH_SIZE) -> int:
+    coerce, stmt, n = _coercer(table), insert(table), 0
+    rows = iter(rows)
+    while batch := [coerce(r) for r in itertools.islice(rows, batch_size)]:
+        conn.execute(stmt, batch)
+        n += len(batch)
+    return n
+
+def import_catalog(engine: Engine, sources: list[tuple[str, object]],
+                   batch_size: int = BATCH_SIZE) -> dict:
+    """Load (table_name, row_iterable) pairs in order; returns rows per table."""
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # loading apps below swaps the FTS triggers, so the index must exist
+        upgrade_search_index(conn)
+    sqlite = engine.dialect.name == "sqlite"
+    with engine.connect() as conn:
+        if sqlite:
+            # the file is rebuilt from source on failure, so trade durability for speed
+            conn.exec_driver_sql("PRAGMA synchronous=OFF")
+            conn.exec_driver_sql("PRAGMA temp_store=MEMORY")
+            conn.exec_driver_sql("PRAGMA cache_size=-262144")
+            conn.commit()
+        try:
+            counts = _import(conn, sources, sqlite, batch_size)
+        finally:
+            if sqlite:
+                # the connection goes back to the pool; restore the defaults
+                conn.exec_driver_sql("PRAGMA synchronous=FULL")
+                conn.exec_driver_sql("PRAGMA cache_size=-2000")
+                conn.commit()
+    return counts
+
+def _import(conn, sources, sqlite: bool, batch_size: int) -> dict:
+    counts = {}
+    for name, rows in sources:
+        table = Base.metadata.tables[name]
+        with conn.begin():
+            deferred = _defer_indexes(conn, table) if sqlite else []
+            if sqlite and table is App.__table__:
+                for trigger in ("apps_fts_ai", "apps_fts_ad", "apps_fts_au"):
+                    conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+            if table is Version.__table__:
+                slugs = dict(conn.execute(select(App.slug, App.id)).all())
+                rows = _version_rows(rows, slugs)
+            counts[name] = load_table(conn, table, rows, batch_size)
+            for ix in deferred:
+                ix.create(conn)
+            if sqlite and table is App.__table__:
+                for ddl in APPS_FTS_DDL[1:]:
+                    conn.exec_driver_sql(ddl)
+                conn.execute(text("INSERT INTO apps_fts(apps_fts) VALUES ('rebuild')"))
+            if table in (App.__table__, Version.__table__):
+                bump_revision(conn)
+    return counts
+
+def rebuild_static():
+    """Full snapshot and catalog index rebuilds, where configured.
+
+    Serving workers only refresh the apps a publish touched, so after a bulk
+    load the listing pages and indexed bodies would stay stale.
+    """
+    from app.catalog_index import CATALOG_INDEX_PATH, build_index
+    from app.snapshots import SNAPSHOT_DIR, build_snapshot
+    if SNAPSHOT_DIR:
+        print(f"snapshot: {build_snapshot(SNAPSHOT_DIR)}")
+    if CATALOG_INDEX_PATH:
+        print(f"catalog index: r{build_index(CATALOG_INDEX_PATH)}")
+
+def main(argv: list[str]):
+    from app.db import engine
+    # every 50k-row batch is "slow"; don't flood the slow-query log
+    logging.getLogger("app.sql.slow").setLevel(logging.ERROR)
+    sources = []
+    for arg in argv:
+        name, _, path = arg.partition("=")
+        if name not in Base.metadata.tables or not path:
+            sys.exit(f"usage: python -m app.importer <table>=<file.ndjson|file.csv> ...  (got {arg!r})")
+        sources.append((name, read_rows(path)))
+    start = time.perf_counter()
+    counts = import_catalog(engine, sources)
+    elapsed = time.perf_counter() - start
+    for name, n in counts.items():
+        print(f"{name}: {n} rows")
+    print(f"{sum(counts.values())} rows in {elapsed:.1f}s "
+          f"({sum(counts.values()) / elapsed * 60:,.0f} rows/min)")
+    rebuild_static()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,9 +1,53 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.routes import apps, versions, auth
+from app.cache import response_cache
+from app.catalog_index import CATALOG_INDEX_PATH, catalog_index, ensure_index
+from app.compression import COMPRESS_MIN_SIZE, compressor
+from app.db import async_engine, async_replicas, engine
+from app.metrics import cache_collector, metrics, pool_collector
+from app.middleware import (AdmissionMiddleware, CompressionMiddleware, MetricsMiddleware,
+                            SQLTimingMiddleware)
+from app.ratelimit import InMemoryRateLimitStore
+from app.responses import FastJSONResponse
+from app.routes import apps, versions, auth, telemetry as telemetry_routes
+from app.telemetry import telemetry
+import logging
+import os
 
-app = FastAPI(title="Hybrid App Store API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if CATALOG_INDEX_PATH:
+        try:
+            await run_in_threadpool(ensure_index)
+        except OSError:
+            # the index is only an accelerator: without it every lookup
+            # misses and is served from the database
+            logging.getLogger("app.catalog_index").exception("catalog index build failed")
+    yield
+    # the last counters of this worker go out before it exits
+    await telemetry.close()
 
+app = FastAPI(title="Hybrid App Store API", version="1.0.0", lifespan=lifespan,
+              default_response_class=FastJSONResponse)
+
+# added innermost first: CORS wraps everything so even 429/503 stay readable
+# by browsers, and metrics see the requests admission control rejects;
+# compression sits inside the latency histogram, so its cost is measured too
+app.add_middleware(CompressionMiddleware, compressor=compressor, minimum_size=COMPRESS_MIN_SIZE)
+app.add_middleware(SQLTimingMiddleware, server_timing=os.getenv("SQL_DEBUG") == "1")
+app.add_middleware(
+    AdmissionMiddleware,
+    store=InMemoryRateLimitStore(),
+    rate=float(os.getenv("RATE_LIMIT_RPS", "20")),
+    burst=float(os.getenv("RATE_LIMIT_BURST", "40")),
+    max_concurrency=int(os.getenv("MAX_CONCURRENCY", "256")),
+    max_queue=int(os.getenv("MAX_QUEUE", "512")),
+    queue_timeout=float(os.getenv("QUEUE_TIMEOUT", "2")),
+)
+app.add_middleware(MetricsMiddleware, metrics=metrics)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # tighten later
@@ -12,10 +56,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+metrics.collectors.append(pool_collector({
+    "primary": engine, "primary_async": async_engine,
+    **{f"replica{i}": e for i, e in enumerate(async_replicas.engines)},
+}))
+metrics.collectors.append(cache_collector(response_cache, "response_cache"))
+metrics.collectors.append(cache_collector(compressor, "compressed_cache"))
+metrics.collectors.append(compressor.collect)
+metrics.collectors.append(lambda: [
+    "# TYPE catalog_index_hits_total counter",
+    f"catalog_index_hits_total {catalog_index.hits}",
+    "# TYPE catalog_index_misses_total counter",
+    f"catalog_index_misses_total {catalog_index.misses}",
+    "# TYPE catalog_index_reloads_total counter",
+    f"catalog_index_reloads_total {catalog_index.reloads}",
+    "# TYPE catalog_index_revision gauge",
+    f"catalog_index_revision {catalog_index.revision or 0}",
+])
+metrics.collectors.append(telemetry.collect)
+metrics.collectors.append(lambda: [
+    "# TYPE latest_version_flights_total counter",
+    f"latest_version_flights_total {versions.latest_flights.started}",
+    "# TYPE latest_version_coalesced_total counter",
+    f"latest_version_coalesced_total {versions.latest_flights.coalesced}",
+])
+
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(apps.router, prefix="/api/apps", tags=["apps"])
 app.include_router(versions.router, prefix="/api/versions", tags=["versions"])
+app.include_router(telemetry_routes.router, prefix="/api/telemetry", tags=["telemetry"])
 
 @app.get("/api/health")
 def health():
-    return {"status": "ok"}
+    return {"status": "ok", "cache": response_cache.stats(), "catalog_index": catalog_index.stats()}
+
+@app.get("/api/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
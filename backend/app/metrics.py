@@ -0,0 +1,74 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+# seconds; chosen around the update-check latency budget
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Metrics:
+    """Process-local request metrics in the Prometheus text format.
+
+    Recording only happens on the event loop thread, so plain dict and list
+    updates are safe without a lock; scrapes read a slightly racy snapshot.
+    """
+    def __init__(self):
+        self.requests = defaultdict(int)     # (method, route, status) -> count
+        self.latency = {}                    # (method, route) -> [bucket counts..., sum, count]
+        self.in_flight = 0
+        self.collectors = []                 # callables yielding extra exposition lines
+
+    def observe(self, method: str, route: str, status: int, seconds: float):
+        self.requests[(method, route, status)] += 1
+        h = self.latency.get((method, route))
+        if h is None:
+            h = self.latency[(method, route)] = [0] * (len(LATENCY_BUCKETS) + 3)
+        h[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        h[-2] += seconds
+        h[-1] += 1
+
+    def render(self) -> str:
+        out = ["# HELP http_requests_total Requests handled, by route and status.",
+               "# TYPE http_requests_total counter"]
+        for (method, route, status), n in list(self.requests.items()):
+            out.append(f'http_requests_total{{method="{method}",route="{route}",status="{status}"}} {n}')
+        out += ["# HELP http_request_duration_seconds Request latency, by route.",
+                "# TYPE http_request_duration_seconds histogram"]
+        for (method, route), h in list(self.latency.items()):
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for le, n in zip(LATENCY_BUCKETS, h):
+                cumulative += n
+                out.append(f'http_request_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            out.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {h[-1]}')
+            out.append(f"http_request_duration_seconds_sum{{{labels}}} {h[-2]:.6f}")
+            out.append(f"http_request_duration_seconds_count{{{labels}}} {h[-1]}")
+        out += ["# HELP http_requests_in_flight Requests currently being handled.",
+                "# TYPE http_requests_in_flight gauge",
+                f"http_requests_in_flight {self.in_flight}"]
+        for collect in self.collectors:
+            out.extend(collect())
+        return "\n".join(out) + "\n"
+
+metrics = Metrics()
+
+def pool_collector(engines: dict):
+    """Expose SQLAlchemy pool checkout/overflow for {name: engine}."""
+    def collect():
+        for metric, attr in (("db_pool_checked_out", "checkedout"),
+                             ("db_pool_overflow", "overflow"), ("db_pool_size", "size")):
+            yield f"# TYPE {metric} gauge"
+            for name, engine in engines.items():
+                if hasattr(engine.pool, attr):
+                    yield f'{metric}{{engine="{name}"}} {getattr(engine.pool, attr)()}'
+    return collect
+
+def cache_collector(cache, name: str):
+    def collect():
+        stats = cache.stats()
+        for key in ("hits", "misses", "evictions", "revision_changes"):
+            if key not in stats:
+                continue
+            yield f"# TYPE {name}_{key}_total counter"
+            yield f"{name}_{key}_total {stats[key]}"
+        yield f"# TYPE {name}_size gauge"
+        yield f"{name}_size {stats['size']}"
+    return collect
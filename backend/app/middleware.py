@@ -0,0 +1,188 @@
+from starlette.datastructures import MutableHeaders
+from starlette.responses import JSONResponse
+from app.compression import COMPRESSIBLE, Compressor, negotiate
+from app.db import QueryStats, query_stats
+from app.metrics import Metrics
+from app.ratelimit import RateLimitStore
+import asyncio
+import logging
+import math
+import time
+
+request_log = logging.getLogger("app.sql.requests")
+
+class SQLTimingMiddleware:
+    """Collects per-request query count and DB time.
+
+    With server_timing on (SQL_DEBUG=1) they are reported as a Server-Timing
+    header, e.g. `db;dur=3.2;desc="4 queries, slowest 1.1ms", app;dur=5.0`,
+    and the slowest statement of each request is logged at debug level.
+    """
+    def __init__(self, app, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = QueryStats()
+        token = query_stats.set(stats)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and self.server_timing:
+                elapsed = (time.perf_counter() - start) * 1000
+                MutableHeaders(scope=message).append("Server-Timing", (
+                    f'db;dur={stats.total * 1000:.1f};desc="{stats.count} queries, '
+                    f'slowest {stats.slowest * 1000:.1f}ms", app;dur={elapsed:.1f}'))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            query_stats.reset(token)
+            if self.server_timing and stats.count:
+                request_log.debug("%s %s: %d queries, %.1fms, slowest: %s", scope["method"],
+                                  scope["path"], stats.count, stats.total * 1000,
+                                  " ".join(stats.slowest_statement.split()))
+
+class MetricsMiddleware:
+    """Counts requests and observes latency per route template (never raw path)."""
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+        metrics = self.metrics
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        metrics.in_flight += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            metrics.in_flight -= 1
+            route = scope.get("route")
+            metrics.observe(scope["method"], route.path if route else "<unmatched>",
+                            status, time.perf_counter() - start)
+
+class AdmissionMiddleware:
+    """Per-client token buckets plus a global concurrency cap with a bounded queue.
+
+    Requests over a client's rate get 429; once max_concurrency requests are
+    running, up to max_queue more wait at most queue_timeout seconds, and
+    anything beyond that gets 503. Both carry Retry-After, and rejecting early
+    keeps latency bounded for the requests that are admitted.
+    """
+    def __init__(self, app, store: RateLimitStore, rate: float, burst: float,
+                 max_concurrency: int, max_queue: int, queue_timeout: float,
+                 exempt: tuple = ("/api/health", "/api/metrics")):
+        self.app = app
+        self.store = store
+        self.rate = rate
+        self.burst = burst
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.exempt = exempt
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+
+    @staticmethod
+    def client_key(scope) -> str:
+        # nginx puts the peer address in X-Forwarded-For
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+        client = scope.get("client")
+        return client[0] if client else "-"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt:
+            return await self.app(scope, receive, send)
+        if self.rate > 0:
+            wait = await self.store.take(self.client_key(scope), self.rate, self.burst)
+            if wait:
+                return await self._reject(scope, receive, send, 429, "rate limited", wait)
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                return await self._reject(scope, receive, send, 503, "overloaded", 1)
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                return await self._reject(scope, receive, send, 503, "overloaded", 1)
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._slots.release()
+
+    async def _reject(self, scope, receive, send, status: int, detail: str, retry_after: float):
+        response = JSONResponse({"detail": detail}, status_code=status,
+                                headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+        await response(scope, receive, send)
+
+class CompressionMiddleware:
+    """Content-negotiated br/gzip for single-message JSON and text bodies.
+
+    Streamed bodies (artifacts, ranges) pass through untouched. Bodies with an
+    ETag are compressed once per encoding by the Compressor; their ETag becomes
+    weak, since the bytes differ from the identity representation while
+    If-None-Match (weak comparison) still revalidates against it.
+    """
+    def __init__(self, app, compressor: Compressor, minimum_size: int):
+        self.app = app
+        self.compressor = compressor
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        encoding = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                encoding = negotiate(value.decode("latin-1"))
+                break
+        if encoding is None:
+            return await self.app(scope, receive, send)
+        start_message = None
+
+        async def send_compressed(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if start_message is None:
+                return await send(message)
+            start, start_message = start_message, None
+            headers = MutableHeaders(scope=start)
+            body = message.get("body", b"")
+            if ("content-encoding" in headers
+                    or not headers.get("content-type", "").startswith(COMPRESSIBLE)):
+                await send(start)
+                return await send(message)
+            headers.add_vary_header("Accept-Encoding")
+            if message.get("more_body") or len(body) < self.minimum_size:
+                await send(start)
+                return await send(message)
+            etag = headers.get("etag")
+            body = self.compressor.compress(body, encoding, etag)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            if etag and not etag.startswith("W/"):
+                headers["ETag"] = "W/" + etag
+            await send(start)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -1,5 +1,7 @@
-from sqlalchemy.orm import DeclarativeBase, relationship, Mapped, mapped_column
-from sqlalchemy import String, Integer, ForeignKey, Boolean, DateTime, Text
+from sqlalchemy.orm import DeclarativeBase, relationship, Mapped, mapped_column, validates
+from sqlalchemy import BigInteger, String, Integer, ForeignKey, Boolean, DateTime, Text, Index, DDL, event, tuple_
+from sqlalchemy.dialects import mysql
+from app import semver as sv
 
 class Base(DeclarativeBase): pass
 
@@ -12,20 +14,117 @@ class User(Base):
 
 class App(Base):
     __tablename__ = "apps"
+    __table_args__ = (
+        # search index on MySQL; SQLite uses the apps_fts table created below
+        Index("ix_apps_fulltext", "name", "description", mysql_prefix="FULLTEXT").ddl_if(dialect="mysql"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     slug: Mapped[str] = mapped_column(String(64), unique=True, index=True)
     name: Mapped[str] = mapped_column(String(255))
     description: Mapped[str] = mapped_column(Text)
     developer_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-    developer = relationship("User")
+    # never lazy-loaded: callers eager-load the columns they serialize, so a
+    # forgotten option fails loudly instead of issuing one query per app
+    developer = relationship("User", lazy="raise")
+
+class CatalogRevision(Base):
+    # single row, bumped in the same transaction as any App/Version change
+    __tablename__ = "catalog_revision"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    value: Mapped[int] = mapped_column(Integer, default=0)
 
 class Version(Base):
     __tablename__ = "versions"
+    __table_args__ = (
+        # serves "highest published release of app X on platform Y" as one index
+        # seek and "everything newer than X" as a range scan over the same index
+        Index("ix_versions_latest", "app_id", "platform", "published",
+              "major", "minor", "patch", "is_release", "prerelease_key", "id"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True)
     app_id: Mapped[int] = mapped_column(ForeignKey("apps.id"))
     semver: Mapped[str] = mapped_column(String(32))
+    # parsed from semver on assignment (app.backfill fills rows written before
+    # these columns existed); prerelease_key is "" for final releases
+    major: Mapped[int] = mapped_column(Integer, default=0)
+    minor: Mapped[int] = mapped_column(Integer, default=0)
+    patch: Mapped[int] = mapped_column(Integer, default=0)
+    is_release: Mapped[bool] = mapped_column(Boolean, default=True)
+    # compared bytewise, which needs a binary collation on MySQL
+    prerelease_key: Mapped[str] = mapped_column(
+        String(96).with_variant(mysql.VARCHAR(96, charset="ascii", collation="ascii_bin"), "mysql"),
+        default="")
     platform: Mapped[str] = mapped_column(String(32))  # android/ios/web
     file_url: Mapped[str] = mapped_column(String(512))
     file_sha256: Mapped[str] = mapped_column(String(64))
     release_notes: Mapped[str] = mapped_column(Text)
     published: Mapped[bool] = mapped_column(Boolean, default=False)
+
+    @validates("semver")
+    def _parse_semver(self, key, value):
+        self.major, self.minor, self.patch, self.is_release, self.prerelease_key = semver_columns(value)
+        return value
+
+    @classmethod
+    def precedence(cls):
+        # exact semver precedence, matching sv.sort_key (rc.9 < rc.10)
+        return (cls.major, cls.minor, cls.patch, cls.is_release, cls.prerelease_key)
+
+    @classmethod
+    def newest_first(cls):
+        return [c.desc() for c in cls.precedence()] + [cls.id.desc()]
+
+    @classmethod
+    def newer_than(cls, semver: str):
+        return tuple_(*cls.precedence()) > tuple_(*semver_columns(semver))
+
+    @classmethod
+    def older_than(cls, semver: str):
+        return tuple_(*cls.precedence()) < tuple_(*semver_columns(semver))
+
+class Patch(Base):
+    # binary delta turning from_version's artifact into to_version's, stored
+    # content-addressed next to the artifacts
+    __tablename__ = "patches"
+    __table_args__ = (
+        Index("ix_patches_pair", "to_version_id", "from_version_id", unique=True),
+    )
+    id: Mapped[int] = mapped_column(primary_key=True)
+    app_id: Mapped[int] = mapped_column(ForeignKey("apps.id"))
+    from_version_id: Mapped[int] = mapped_column(ForeignKey("versions.id"))
+    to_version_id: Mapped[int] = mapped_column(ForeignKey("versions.id"))
+    sha256: Mapped[str] = mapped_column(String(64))
+    size: Mapped[int] = mapped_column(Integer)
+
+class VersionStat(Base):
+    # per-minute download/install counters, written only as additive upserts by
+    # app.telemetry; version_id carries no foreign key so one stray id from a
+    # client cannot fail a whole flush
+    __tablename__ = "version_stats"
+    version_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    event_type: Mapped[str] = mapped_column(String(16), primary_key=True)
+    minute: Mapped[int] = mapped_column(Integer, primary_key=True)  # unix time // 60
+    count: Mapped[int] = mapped_column(BigInteger, default=0)
+
+def semver_columns(semver: str) -> tuple[int, int, int, bool, str]:
+    major, minor, patch, pre = sv.parse(semver)
+    return major, minor, patch, pre is None, sv.prerelease_key(pre)
+
+# external-content FTS5 index over apps, kept in sync by triggers so every
+# worker and replica sees the same index without an in-process copy
+APPS_FTS_DDL = [
+    "CREATE VIRTUAL TABLE apps_fts USING fts5(name, description, "
+    "content='apps', content_rowid='id', prefix='2 3')",
+    "CREATE TRIGGER apps_fts_ai AFTER INSERT ON apps BEGIN "
+    "INSERT INTO apps_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+    "CREATE TRIGGER apps_fts_ad AFTER DELETE ON apps BEGIN "
+    "INSERT INTO apps_fts(apps_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); END",
+    "CREATE TRIGGER apps_fts_au AFTER UPDATE ON apps BEGIN "
+    "INSERT INTO apps_fts(apps_fts, rowid, name, description) "
+    "VALUES ('delete', old.id, old.name, old.description); "
+    "INSERT INTO apps_fts(rowid, name, description) VALUES (new.id, new.name, new.description); END",
+]
+for _stmt in APPS_FTS_DDL:
+    event.listen(App.__table__, "after_create", DDL(_stmt).execute_if(dialect="sqlite"))
+event.listen(App.__table__, "before_drop", DDL("DROP TABLE IF EXISTS apps_fts").execute_if(dialect="sqlite"))
@@ -0,0 +1,34 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+import time
+
+class RateLimitStore(ABC):
+    """Token-bucket backend. take() returns 0 when a token was granted, else
+    the seconds until one will be. Subclass with a shared store (e.g. a Redis
+    script doing the same arithmetic) to enforce limits across nodes.
+    """
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        ...
+
+class InMemoryRateLimitStore(RateLimitStore):
+    """Per-process buckets, bounded by evicting the least recently seen client."""
+    def __init__(self, max_clients: int = 100_000):
+        self.max_clients = max_clients
+        self._buckets: OrderedDict = OrderedDict()  # key -> [tokens, last refill]
+
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rate
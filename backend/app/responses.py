@@ -0,0 +1,40 @@
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+import orjson
+
+_encoders: dict = {}  # model class -> callable returning its JSON-ready form
+
+def _encoder(cls):
+    decorators = cls.__pydantic_decorators__
+    # a model whose fields serialize as themselves (no aliases, exclusions,
+    # serializers, computed fields, extras or ser_* settings) has a __dict__
+    # that is exactly what model_dump returns
+    config = cls.model_config
+    if (decorators.field_serializers or decorators.model_serializers
+            or cls.model_computed_fields
+            or config.get("extra") == "allow"
+            or any(k.startswith("ser_") for k in config)
+            or any(f.alias or f.serialization_alias or f.exclude
+                   for f in cls.model_fields.values())):
+        return lambda obj: obj.model_dump(mode="json")
+    return vars
+
+def _default(obj):
+    # called once per nested model, so the per-class decision is cached
+    encode = _encoders.get(type(obj))
+    if encode is None:
+        if not isinstance(obj, BaseModel):
+            raise TypeError(f"{type(obj).__name__} is not JSON serializable")
+        encode = _encoders[type(obj)] = _encoder(type(obj))
+    return encode(obj)
+
+def dumps(content) -> bytes:
+    """orjson, with pydantic models walked natively instead of via model_dump."""
+    return orjson.dumps(content, default=_default)
+
+class FastJSONResponse(ORJSONResponse):
+    """Default response class. Routes on hot paths return one directly with
+    their typed models, which skips FastAPI's response_model re-validation and
+    jsonable_encoder pass; response_model then only documents the schema."""
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -1,17 +1,65 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.db import get_db
-from app.models import App
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from app.cache import MISS, app_tags, check_revision, fill_bind, response_cache
+from app.catalog import catalog_revision
+from app.catalog_index import catalog_index
+from app.conditional import (etag_body_response, etag_matches, etag_response, not_modified,
+                             payload_etag)
+from app.db import AsyncSessionLocal, get_async_read_db, pinned_to_primary
+from app.models import App, User
+from app.responses import FastJSONResponse
+from app.search import search_apps
+from app.schemas import AppDetail, AppPage, AppSummary
 
 router = APIRouter()
 
-@router.get("")
-def list_apps(db: Session = Depends(get_db)):
-    return db.query(App).all()
+@router.get("", response_model=AppPage)
+async def list_apps(request: Request,
+                    cursor: int | None = None,
+                    limit: int = Query(50, ge=1, le=500),
+                    db: AsyncSession = Depends(get_async_read_db)):
+    # the page is a pure function of (revision, cursor, limit), so a matching
+    # If-None-Match is answered after one primary-key read of the revision
+    etag = '"r%d-%d-%d"' % (await catalog_revision(db), cursor or 0, limit)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    # keyset pagination on the primary key: cost is independent of page depth
+    stmt = select(App.id, App.slug, App.name)
+    if cursor is not None:
+        stmt = stmt.where(App.id > cursor)
+    rows = (await db.execute(stmt.order_by(App.id).limit(limit + 1))).all()
+    items = [AppSummary.model_validate(r) for r in rows[:limit]]
+    next_cursor = items[-1].id if len(rows) > limit else None
+    return etag_response(request, etag, AppPage(items=items, next_cursor=next_cursor))
+
+@router.get("/search", response_model=list[AppSummary])
+async def search(q: str = Query(..., min_length=1, max_length=128),
+                 limit: int = Query(20, ge=1, le=100),
+                 db: AsyncSession = Depends(get_async_read_db)):
+    return FastJSONResponse([AppSummary.model_validate(r) for r in await search_apps(db, q, limit)])
 
 @router.get("/{slug}")
-def app_detail(slug: str, db: Session = Depends(get_db)):
-    app = db.query(App).filter_by(slug=slug).first()
-    if not app:
-        return {"error": "not_found"}
-    return app
+async def app_detail(slug: str, request: Request):
+    indexed = None if pinned_to_primary(request) else catalog_index.app(slug)
+    if indexed:
+        return etag_body_response(request, *indexed)
+    key = ("app_detail", slug)
+    await check_revision()
+    cached = response_cache.get(key)
+    if cached is MISS:
+        generation = response_cache.generation
+        stmt = (select(App)
+                  .options(joinedload(App.developer).load_only(User.id))
+                  .filter_by(slug=slug))
+        async with AsyncSessionLocal(bind=fill_bind(request)) as db:
+            app = (await db.execute(stmt)).scalars().first()
+            if not app:
+                cached, tags = (None, {"error": "not_found"}), app_tags(slug)
+            else:
+                payload = AppDetail.model_validate(app).model_dump()
+                cached, tags = (payload_etag(payload), payload), app_tags(slug, app.id)
+        response_cache.set(key, cached, tags, generation)
+    etag, payload = cached
+    return payload if etag is None else etag_response(request, etag, payload)
@@ -1,11 +1,35 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db import get_async_read_db
+from app.models import User
+from app.schemas import LoginRequest, RefreshRequest
+from app.security import (ACCESS_TOKEN_TTL, REFRESH_TOKEN_TTL, TokenError, create_token,
+                          decode_token, verify_password)
 
 router = APIRouter()
 
 @router.post("/login")
-def login():
-    return {"token": "dummy-token"}
+async def login(body: LoginRequest, db: AsyncSession = Depends(get_async_read_db)):
+    user = (await db.execute(
+        select(User.id, User.role, User.password_hash).where(User.email == body.email))).first()
+    if not await verify_password(body.password, user.password_hash if user else None):
+        raise HTTPException(status_code=401, detail="invalid credentials")
+    return {
+        "token": create_token(user.id, "access", user.role, ACCESS_TOKEN_TTL),
+        "refresh_token": create_token(user.id, "refresh", user.role, REFRESH_TOKEN_TTL),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL,
+    }
 
 @router.post("/refresh")
-def refresh():
-    return {"token": "dummy-refresh-token"}
+async def refresh(body: RefreshRequest):
+    try:
+        claims = decode_token(body.refresh_token, "refresh")
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    return {
+        "token": create_token(int(claims["sub"]), "access", claims["role"], ACCESS_TOKEN_TTL),
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_TTL,
+    }
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException
+from app.schemas import TelemetryBatch
+from app.telemetry import Backpressure, TELEMETRY_FLUSH_INTERVAL, telemetry
+import math
+
+router = APIRouter()
+
+@router.post("", status_code=202)
+async def ingest(body: TelemetryBatch):
+    # accepted into memory, not yet durable: see app.telemetry for the loss window
+    try:
+        accepted = telemetry.add(body.events)
+    except Backpressure:
+        raise HTTPException(status_code=503, detail="telemetry backlog full",
+                            headers={"Retry-After": str(max(1, math.ceil(TELEMETRY_FLUSH_INTERVAL)))})
+    return {"accepted": accepted}
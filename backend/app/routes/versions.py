@@ -1,25 +1,229 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from app.db import get_db
-from app.models import Version, App
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from sqlalchemy import and_, delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from app.cache import MISS, app_tags, check_revision, fill_bind, response_cache
+from app.catalog import release_etag, release_payload
+from app.catalog_index import catalog_index, index_scheduler
+from app.conditional import etag_body_response, etag_matches, etag_response
+from app.db import AsyncSessionLocal, get_async_db, get_async_read_db, pinned_to_primary
+from app.deltas import build_deltas
+from app.models import Patch, Version, VersionStat, App
+from app.responses import FastJSONResponse
+from app.schemas import UpdateCheck, UpdateInfo
+from app.security import require_developer
+from app.singleflight import SingleFlight
+from app.snapshots import snapshot_scheduler
+from app.storage import (ARTIFACT_ACCEL_PREFIX, ArtifactResponse, ArtifactTooLarge,
+                         DigestMismatch, artifact_path, artifact_relpath, store_stream)
+from app import semver as sv
+import asyncio
+import os
 
 router = APIRouter()
 
+SINGLEFLIGHT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_TIMEOUT", "5"))
+latest_flights = SingleFlight()
+
 @router.get("/{slug}/latest")
-def latest_version(slug: str, platform: str, db: Session = Depends(get_db)):
-    app = db.query(App).filter_by(slug=slug).first()
-    if not app:
-        return {"error": "not_found"}
-    v = (db.query(Version)
-           .filter_by(app_id=app.id, platform=platform, published=True)
-           .order_by(Version.id.desc())
-           .first())
+async def latest_version(slug: str, platform: str, request: Request,
+                         from_: str | None = Query(None, alias="from")):
+    # the shared index and cached entries carry their ETag, so a matching
+    # If-None-Match is a 304 with neither a database read nor serialization
+    indexed = None if from_ or pinned_to_primary(request) else catalog_index.latest(slug, platform)
+    if indexed:
+        return etag_body_response(request, *indexed)
+    key = ("latest_version", slug, platform, from_)
+    await check_revision()
+    cached = response_cache.get(key)
+    if cached is MISS:
+        if pinned_to_primary(request):
+            cached = await _fill_latest(key, fill_bind(request))
+        else:
+            # on a cold key every concurrent check waits on one query
+            try:
+                cached = await latest_flights.do(
+                    key, lambda: _fill_latest(key, fill_bind()), SINGLEFLIGHT_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise HTTPException(status_code=503, detail="lookup timed out",
+                                    headers={"Retry-After": "1"})
+    etag, payload = cached
+    return payload if etag is None else etag_response(request, etag, payload)
+
+async def _fill_latest(key, bind):
+    # owns its session: the flight can outlive the request that started it
+    generation = response_cache.generation
+    async with AsyncSessionLocal(bind=bind) as db:
+        etag, payload, tags = await _resolve_latest(db, *key[1:])
+    response_cache.set(key, (etag, payload), tags, generation)
+    return etag, payload
+
+async def _resolve_latest(db: AsyncSession, slug: str, platform: str, from_: str | None):
+    # one round trip: the outer join keeps the app row even when it has no
+    # matching release, so not_found and no_version stay distinguishable
+    stmt = (select(App.id, Version)
+              .outerjoin(Version, and_(Version.app_id == App.id,
+                                       Version.platform == platform,
+                                       Version.published == True))  # noqa: E712
+              .where(App.slug == slug)
+              .order_by(*Version.newest_first())
+              .limit(1))
+    row = (await db.execute(stmt)).first()
+    if not row:
+        return None, {"error": "not_found"}, app_tags(slug)
+    v = row.Version
+    if not v:
+        return None, {"error": "no_version"}, app_tags(slug, row.id)
+    payload = release_payload(v)
+    etag = release_etag(v)
+    if from_ and from_ != v.semver:
+        base = aliased(Version)
+        patch = (await db.execute(
+            select(Patch)
+            .join(base, base.id == Patch.from_version_id)
+            .where(Patch.to_version_id == v.id, base.semver == from_)
+            .limit(1))).scalars().first()
+        if patch:
+            payload["patch"] = {
+                "from": from_,
+                "url": f"/api/versions/{v.id}/patches/{patch.from_version_id}",
+                "size": patch.size,
+                "sha256": patch.sha256,
+            }
+            etag += "-" + patch.sha256[:16]
+    return '"%s"' % etag, payload, app_tags(slug, row.id)
+
+@router.post("/check", response_model=list[UpdateInfo])
+async def check_updates(body: UpdateCheck, db: AsyncSession = Depends(get_async_read_db)):
+    # one set-based query for the whole manifest instead of one request per app
+    wanted = {(i.slug, i.platform): i.semver for i in body.installed}
+    if not wanted:
+        return []
+    slugs = {slug for slug, _ in wanted}
+    platforms = {platform for _, platform in wanted}
+    ranked = (select(Version.id,
+                     func.row_number().over(partition_by=(Version.app_id, Version.platform),
+                                            order_by=Version.newest_first()).label("rank"))
+                .join(App, App.id == Version.app_id)
+                .where(App.slug.in_(slugs),
+                       Version.platform.in_(platforms),
+                       Version.published == True)  # noqa: E712
+                .subquery())
+    stmt = (select(App.slug, Version)
+              .join(Version, Version.app_id == App.id)
+              .join(ranked, and_(ranked.c.id == Version.id, ranked.c.rank == 1)))
+    rows = (await db.execute(stmt)).all()
+    updates = []
+    for slug, v in rows:
+        installed = wanted.get((slug, v.platform))
+        if installed is None:
+            continue
+        try:
+            newer = sv.sort_key(v.semver) > sv.sort_key(installed)
+        except ValueError:
+            newer = v.semver != installed
+        if newer:
+            updates.append(UpdateInfo(slug=slug, platform=v.platform, installed=installed,
+                                      semver=v.semver, file_url=v.file_url,
+                                      file_sha256=v.file_sha256,
+                                      release_notes=v.release_notes))
+    return FastJSONResponse(updates)
+
+async def _owned_version(db: AsyncSession, version_id: int, user: dict) -> Version:
+    v = await db.get(Version, version_id)
     if not v:
-        return {"error": "no_version"}
-    return {
-        "semver": v.semver,
-        "platform": v.platform,
-        "file_url": v.file_url,
-        "file_sha256": v.file_sha256,
-        "release_notes": v.release_notes,
-    }
+        raise HTTPException(status_code=404, detail="version not found")
+    developer_id = (await db.execute(select(App.developer_id).where(App.id == v.app_id))).scalar()
+    if user["role"] != "admin" and str(developer_id) != user["sub"]:
+        raise HTTPException(status_code=403, detail="not your app")
+    return v
+
+@router.put("/{version_id}/artifact")
+async def upload_artifact(version_id: int, request: Request, background: BackgroundTasks,
+                          db: AsyncSession = Depends(get_async_db),
+                          user: dict = Depends(require_developer)):
+    v = await _owned_version(db, version_id, user)
+    try:
+        sha256, size = await store_stream(request.stream(), request.headers.get("x-content-sha256"))
+    except ArtifactTooLarge:
+        raise HTTPException(status_code=413, detail="artifact too large")
+    except DigestMismatch:
+        raise HTTPException(status_code=400, detail="sha256 mismatch")
+    rebuild = []
+    if v.file_sha256 and v.file_sha256 != sha256:
+        # patches to or from the old bytes would turn into corrupt updates
+        newer = (await db.execute(select(Patch.to_version_id)
+                                  .where(Patch.from_version_id == v.id))).scalars().all()
+        await db.execute(delete(Patch).where(or_(Patch.to_version_id == v.id,
+                                                 Patch.from_version_id == v.id)))
+        rebuild = [v.id, *set(newer)]
+    v.file_sha256 = sha256
+    v.file_url = f"/api/versions/{v.id}/artifact"
+    await db.commit()
+    if v.published:
+        for to_version_id in rebuild:
+            background.add_task(build_deltas, to_version_id)
+        snapshot_scheduler.schedule(v.app_id)
+        index_scheduler.schedule(v.app_id)
+    return {"file_url": v.file_url, "file_sha256": sha256, "size": size}
+
+@router.post("/{version_id}/publish")
+async def publish_version(version_id: int, background: BackgroundTasks,
+                          db: AsyncSession = Depends(get_async_db),
+                          user: dict = Depends(require_developer)):
+    v = await _owned_version(db, version_id, user)
+    if not v.file_sha256:
+        raise HTTPException(status_code=409, detail="artifact not uploaded")
+    v.published = True
+    await db.commit()
+    background.add_task(build_deltas, v.id)
+    snapshot_scheduler.schedule(v.app_id)
+    index_scheduler.schedule(v.app_id)
+    return {"id": v.id, "semver": v.semver, "published": True}
+
+@router.get("/{version_id}/stats")
+async def version_stats(version_id: int, since: int | None = None,
+                        db: AsyncSession = Depends(get_async_read_db),
+                        user: dict = Depends(require_developer)):
+    # since: unix seconds; counters are per minute, so this is minute-granular
+    await _owned_version(db, version_id, user)
+    stmt = (select(VersionStat.event_type, func.sum(VersionStat.count))
+              .where(VersionStat.version_id == version_id)
+              .group_by(VersionStat.event_type))
+    if since is not None:
+        stmt = stmt.where(VersionStat.minute >= since // 60)
+    counts = {"download": 0, "install": 0}
+    counts.update((event, int(n)) for event, n in (await db.execute(stmt)).all())
+    return {"version_id": version_id, "counts": counts}
+
+@router.get("/{version_id}/artifact")
+async def download_artifact(version_id: int, request: Request,
+                            db: AsyncSession = Depends(get_async_read_db)):
+    v = await db.get(Version, version_id)
+    if not v or not v.published or not v.file_sha256:
+        raise HTTPException(status_code=404, detail="artifact not found")
+    return _serve_blob(request, v.file_sha256)
+
+@router.get("/{version_id}/patches/{from_version_id}")
+async def download_patch(version_id: int, from_version_id: int, request: Request,
+                         db: AsyncSession = Depends(get_async_read_db)):
+    patch = (await db.execute(
+        select(Patch).where(Patch.to_version_id == version_id,
+                            Patch.from_version_id == from_version_id))).scalars().first()
+    if not patch:
+        raise HTTPException(status_code=404, detail="patch not found")
+    return _serve_blob(request, patch.sha256)
+
+def _serve_blob(request: Request, sha256: str) -> Response:
+    etag = '"%s"' % sha256
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    if ARTIFACT_ACCEL_PREFIX:
+        # nginx serves the bytes (ranges included) from its internal location
+        headers["X-Accel-Redirect"] = ARTIFACT_ACCEL_PREFIX + artifact_relpath(sha256)
+        return Response(headers=headers, media_type="application/octet-stream")
+    path = artifact_path(sha256)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="artifact not found")
+    return ArtifactResponse(path, headers=headers, media_type="application/octet-stream")
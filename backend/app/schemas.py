@@ -0,0 +1,65 @@
+from typing import Literal
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from app import semver as sv
+
+class AppSummary(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    slug: str
+    name: str
+
+class AppPage(BaseModel):
+    items: list[AppSummary]
+    next_cursor: int | None = None
+
+class InstalledApp(BaseModel):
+    slug: str
+    platform: str
+    semver: str
+
+    @field_validator("semver")
+    @classmethod
+    def _valid_semver(cls, v: str) -> str:
+        sv.parse(v)
+        return v
+
+class UpdateCheck(BaseModel):
+    installed: list[InstalledApp] = Field(max_length=500)
+
+class UpdateInfo(BaseModel):
+    slug: str
+    platform: str
+    installed: str
+    semver: str
+    file_url: str
+    file_sha256: str
+    release_notes: str
+
+class DeveloperSummary(BaseModel):
+    # public: the email is the login name, so it is never exposed here
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+
+class AppDetail(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id: int
+    slug: str
+    name: str
+    description: str
+    developer_id: int
+    developer: DeveloperSummary
+
+class LoginRequest(BaseModel):
+    email: str
+    password: str = Field(max_length=72)
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+class TelemetryEvent(BaseModel):
+    version_id: int = Field(gt=0, lt=2**31)  # the INT column's range
+    event: Literal["download", "install"]
+    ts: int | None = None  # unix seconds on the client; server time if missing
+
+class TelemetryBatch(BaseModel):
+    events: list[TelemetryEvent] = Field(max_length=1000)
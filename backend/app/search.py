@@ -0,0 +1,61 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models import APPS_FTS_DDL, App
+import re
+
+# bm25 column weights: a hit in the name outranks one in the description
+_SQLITE_SEARCH = text(
+    "SELECT apps.id, apps.slug, apps.name FROM apps_fts "
+    "JOIN apps ON apps.id = apps_fts.rowid "
+    "WHERE apps_fts MATCH :match ORDER BY bm25(apps_fts, 10.0, 1.0) LIMIT :limit")
+_MYSQL_SEARCH = text(
+    "SELECT id, slug, name FROM apps "
+    "WHERE MATCH(name, description) AGAINST (:match IN BOOLEAN MODE) "
+    "ORDER BY MATCH(name, description) AGAINST (:match IN BOOLEAN MODE) DESC LIMIT :limit")
+
+def _terms(q: str) -> list[str]:
+    return re.findall(r"\w+", q.lower())[:8]
+
+def match_expression(q: str, dialect: str) -> str | None:
+    """Turn free text into an AND of prefix terms, so partial words match as typed."""
+    terms = _terms(q)
+    if not terms:
+        return None
+    if dialect == "mysql":
+        return " ".join(f"+{t}*" for t in terms)
+    return " ".join(f'"{t}"*' for t in terms)
+
+async def search_apps(db: AsyncSession, q: str, limit: int):
+    dialect = db.bind.dialect.name
+    match = match_expression(q, dialect)
+    if match is None:
+        return []
+    stmt = _MYSQL_SEARCH if dialect == "mysql" else _SQLITE_SEARCH
+    return (await db.execute(stmt, {"match": match, "limit": limit})).all()
+
+def upgrade_search_index(conn) -> bool:
+    """Create the search index on an apps table that predates it; True if anything changed.
+
+    create_all builds it only together with a new apps table, so existing
+    databases get it here (app.backfill runs this).
+    """
+    insp = inspect(conn)
+    if conn.dialect.name == "mysql":
+        index = next(ix for ix in App.__table__.indexes if ix.name == "ix_apps_fulltext")
+        if index.name in {ix["name"] for ix in insp.get_indexes(App.__table__.name)}:
+            return False
+        index.create(conn)
+        return True
+    if conn.dialect.name != "sqlite":
+        return False
+    existing = set(conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")).scalars())
+    # "CREATE VIRTUAL TABLE apps_fts ..." / "CREATE TRIGGER apps_fts_ai ..."
+    missing = [ddl for ddl in APPS_FTS_DDL
+               if ddl.split()[3 if ddl.startswith("CREATE VIRTUAL") else 2] not in existing]
+    if not missing:
+        return False
+    for ddl in missing:
+        conn.exec_driver_sql(ddl)
+    conn.execute(text("INSERT INTO apps_fts(apps_fts) VALUES ('rebuild')"))
+    return True
@@ -0,0 +1,129 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import Depends, HTTPException
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from passlib.context import CryptContext
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+
+# anyone holding the secret can mint admin tokens, so there is no shared
+# default: only an explicit APP_ENV=dev falls back to a throwaway one
+JWT_SECRET = os.getenv("JWT_SECRET", "").encode()
+if not JWT_SECRET:
+    if os.getenv("APP_ENV") != "dev":
+        raise RuntimeError("JWT_SECRET is not set (use APP_ENV=dev for a local throwaway secret)")
+    JWT_SECRET = b"dev-only-change-me"
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "900"))
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", str(7 * 24 * 3600)))
+# bcrypt costs ~250ms of CPU; it runs in its own processes so it can neither
+# block the event loop nor occupy the threadpool that serves update checks
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", "2"))
+BCRYPT_CONCURRENCY = int(os.getenv("BCRYPT_CONCURRENCY", "8"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "4096"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# verified against when the email is unknown, so both paths cost the same
+_DUMMY_HASH = "$2b$12$kr2rzDQKA0UjLbnr7sUiW.Ot83/lZHXvA.DbYqpwhZNE0bGaObJZK"
+
+class TokenError(Exception):
+    pass
+
+_pool: ProcessPoolExecutor | None = None
+_bcrypt_slots: asyncio.Semaphore | None = None
+
+def _verify(password: str, password_hash: str) -> bool:
+    try:
+        return pwd_context.verify(password, password_hash)
+    except ValueError:
+        return False
+
+async def verify_password(password: str, password_hash: str | None) -> bool:
+    global _pool, _bcrypt_slots
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS)
+        _bcrypt_slots = asyncio.Semaphore(BCRYPT_CONCURRENCY)
+    async with _bcrypt_slots:
+        ok = await asyncio.get_running_loop().run_in_executor(
+            _pool, _verify, password, password_hash or _DUMMY_HASH)
+    return ok and password_hash is not None
+
+def hash_password(password: str) -> str:
+    return pwd_context.hash(password)
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _unb64(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+_HEADER = _b64(json.dumps({"alg": "HS256", "typ": "JWT"}, separators=(",", ":")).encode())
+
+def create_token(sub: int, kind: str, role: str, ttl: int) -> str:
+    now = int(time.time())
+    claims = {"sub": str(sub), "typ": kind, "role": role, "iat": now, "exp": now + ttl}
+    signing_input = _HEADER + "." + _b64(json.dumps(claims, separators=(",", ":")).encode())
+    sig = hmac.new(JWT_SECRET, signing_input.encode(), hashlib.sha256).digest()
+    return signing_input + "." + _b64(sig)
+
+class _VerifiedTokens:
+    """Small LRU of token -> claims so hot clients skip the HMAC and JSON decode."""
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str):
+        with self._lock:
+            claims = self._data.get(token)
+            if claims is not None:
+                self._data.move_to_end(token)
+            return claims
+
+    def put(self, token: str, claims: dict):
+        with self._lock:
+            self._data[token] = claims
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+_verified = _VerifiedTokens(TOKEN_CACHE_SIZE)
+
+def decode_token(token: str, kind: str) -> dict:
+    claims = _verified.get(token)
+    if claims is None:
+        try:
+            signing_input, _, sig = token.rpartition(".")
+            header, _, payload = signing_input.partition(".")
+            expected = hmac.new(JWT_SECRET, signing_input.encode(), hashlib.sha256).digest()
+            if header != _HEADER or not hmac.compare_digest(_unb64(sig), expected):
+                raise TokenError("bad signature")
+            claims = json.loads(_unb64(payload))
+        except (ValueError, TypeError) as e:
+            raise TokenError("malformed token") from e
+        _verified.put(token, claims)
+    if claims.get("typ") != kind:
+        raise TokenError("wrong token type")
+    if claims.get("exp", 0) <= time.time():
+        raise TokenError("token expired")
+    return claims
+
+_bearer = HTTPBearer(auto_error=False)
+
+def current_user(credentials: HTTPAuthorizationCredentials | None = Depends(_bearer)) -> dict:
+    if credentials is None:
+        raise HTTPException(status_code=401, detail="not authenticated",
+                            headers={"WWW-Authenticate": "Bearer"})
+    try:
+        return decode_token(credentials.credentials, "access")
+    except TokenError as e:
+        raise HTTPException(status_code=401, detail=str(e), headers={"WWW-Authenticate": "Bearer"})
+
+def require_developer(user: dict = Depends(current_user)) -> dict:
+    if user.get("role") not in ("developer", "admin"):
+        raise HTTPException(status_code=403, detail="developer role required")
+    return user
@@ -0,0 +1,31 @@
+import re
+
+_SEMVER = re.compile(
+    r"^v?(\d+)(?:\.(\d+))?(?:\.(\d+))?(?:-([0-9A-Za-z.-]+))?(?:\+[0-9A-Za-z.-]+)?$")
+
+def parse(semver: str) -> tuple[int, int, int, str | None]:
+    m = _SEMVER.match(semver.strip())
+    if not m:
+        raise ValueError(f"invalid semver: {semver!r}")
+    major, minor, patch, pre = m.groups()
+    return int(major), int(minor or 0), int(patch or 0), pre
+
+def sort_key(semver: str) -> tuple:
+    # semver precedence: a release outranks its prereleases, numeric
+    # prerelease identifiers compare numerically and below alphanumeric ones
+    major, minor, patch, pre = parse(semver)
+    if pre is None:
+        return (major, minor, patch, 1, ())
+    ids = tuple((0, int(p), "") if p.isdigit() else (1, 0, p) for p in pre.split("."))
+    return (major, minor, patch, 0, ids)
+
+def prerelease_key(pre: str | None) -> str:
+    """A string whose plain byte order is semver precedence between prereleases
+    of one version, so SQL can sort and compare on it: numeric identifiers are
+    length-prefixed (9 < 10) and sort below alphanumeric ones, and "!" sorts
+    below every identifier character, so a shorter identifier list ranks lower.
+    Final releases get "" and are ordered by is_release instead."""
+    if pre is None:
+        return ""
+    return "!".join("0%03d%s" % (len(str(int(p))), int(p)) if p.isdigit() else "1" + p
+                    for p in pre.split("."))
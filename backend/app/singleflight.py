@@ -0,0 +1,30 @@
+import asyncio
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key onto one in-flight task.
+
+    The work runs as its own task, so a caller that times out or disconnects
+    does not cancel it for the others; its result or exception is delivered to
+    every caller waiting on the key.
+    """
+    def __init__(self):
+        self._calls: dict = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn, timeout: float):
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            self.started += 1
+            task.add_done_callback(lambda t: self._done(key, t))
+        else:
+            self.coalesced += 1
+        return await asyncio.wait_for(asyncio.shield(task), timeout)
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # retrieved, so an error nobody awaited isn't logged as lost
@@ -0,0 +1,158 @@
+"""Static catalog snapshots for nginx.
+
+Renders every list_apps page (default page size) and every app's latest
+release per platform as JSON plus precompressed .gz/.br siblings into a fresh
+release directory, then atomically repoints SNAPSHOT_DIR/current at it. nginx
+serves those files with try_files and falls back to the API on a miss.
+
+Publishing a release changes only its app's latest files, so publishes and
+uploads rewrite just those in the current release, one os.replace per file.
+The listing pages only change through bulk imports, and the importer CLI runs
+the full rebuild itself. Full builds never run in a serving worker; until the
+CLI has made the first one, every nginx lookup misses and goes to the API.
+
+    python -m app.snapshots    # full rebuild, e.g. from cron or a deploy hook
+"""
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import select
+from app.catalog import latest_releases, release_payload
+from app.compression import compress
+from app.conditional import json_body
+from app.db import engine
+from app.models import App
+import asyncio
+import logging
+import os
+import shutil
+import time
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "")
+SNAPSHOT_DEBOUNCE = float(os.getenv("SNAPSHOT_DEBOUNCE", "10"))
+PAGE_SIZE = 50  # list_apps' default limit, the only page size nginx maps
+KEEP_RELEASES = 2
+
+log = logging.getLogger("app.snapshots")
+
+def _write(root: str, relpath: str, payload, replace: bool = False):
+    # replace: the tree is live, so each file is swapped in whole
+    body = json_body(payload)
+    path = os.path.join(root, relpath)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # the response cache's settings: brotli 11 is ~50x the CPU of 6 on these
+    # sub-3KB bodies for no smaller output
+    for suffix, data in (("", body), (".gz", compress(body, "gzip", True)),
+                         (".br", compress(body, "br", True))):
+        target = path + suffix
+        tmp = f"{target}.{os.getpid()}.tmp" if replace else target
+        with open(tmp, "wb") as f:
+            f.write(data)
+        if replace:
+            os.replace(tmp, target)
+
+def _render(conn, root: str) -> int:
+    files, cursor = 0, 0
+    while True:
+        rows = conn.execute(select(App.id, App.slug, App.name).where(App.id > cursor)
+                            .order_by(App.id).limit(PAGE_SIZE + 1)).all()
+        items = [{"id": r.id, "slug": r.slug, "name": r.name} for r in rows[:PAGE_SIZE]]
+        next_cursor = items[-1]["id"] if len(rows) > PAGE_SIZE else None
+        _write(root, f"apps/page-{cursor}-{PAGE_SIZE}.json",
+               {"items": items, "next_cursor": next_cursor})
+        files += 1
+        if next_cursor is None:
+            break
+        cursor = next_cursor
+    for row in conn.execution_options(stream_results=True, yield_per=5000).execute(latest_releases()):
+        _write(root, f"versions/{row.slug}/latest/{row.platform}.json", release_payload(row))
+        files += 1
+    return files
+
+def build_snapshot(snapshot_dir: str = SNAPSHOT_DIR) -> str:
+    start = time.perf_counter()
+    releases = os.path.join(snapshot_dir, "releases")
+    name = str(time.time_ns())
+    root = os.path.join(releases, name)
+    os.makedirs(root)
+    try:
+        with engine.connect() as conn:
+            files = _render(conn, root)
+    except BaseException:
+        shutil.rmtree(root, ignore_errors=True)
+        raise
+    # atomic swap: readers see either the old tree or the new one, never a mix;
+    # the temporary link is per process since every worker may build
+    link = os.path.join(snapshot_dir, "current")
+    tmp = f"{link}.{os.getpid()}.tmp"
+    if os.path.lexists(tmp):
+        os.unlink(tmp)
+    os.symlink(os.path.join("releases", name), tmp)
+    os.replace(tmp, link)
+    for old in sorted(os.listdir(releases), key=int)[:-KEEP_RELEASES]:
+        shutil.rmtree(os.path.join(releases, old), ignore_errors=True)
+    log.info("snapshot %s: %d files in %.1fs", name, files, time.perf_counter() - start)
+    return root
+
+def update_apps(app_ids, snapshot_dir: str = SNAPSHOT_DIR) -> int:
+    """Rewrite the latest-release files of these apps in the current snapshot."""
+    link = os.path.join(snapshot_dir, "current")
+    if not os.path.exists(link):
+        # a full build is too heavy for a serving worker; until the CLI has
+        # made one, nginx misses and falls through to the API
+        log.warning("no snapshot in %s yet; run python -m app.snapshots", snapshot_dir)
+        return 0
+    # resolved once, so a concurrent full rebuild cannot split the update
+    root = os.path.realpath(link)
+    files = 0
+    with engine.connect() as conn:
+        for row in conn.execute(latest_releases().where(App.id.in_(list(app_ids)))):
+            _write(root, f"versions/{row.slug}/latest/{row.platform}.json",
+                   release_payload(row), replace=True)
+            files += 1
+    return files
+
+class RebuildScheduler:
+    """Debounces rebuilds: a burst of publishes produces one build, and a
+    publish that lands while a build is running triggers one more after it.
+
+    schedule(*keys) with an update callable queues a partial update of just
+    those keys instead; a pending full build covers every queued key.
+    """
+    def __init__(self, delay: float, build, update=None):
+        self.delay = delay
+        self.build = build  # None disables scheduling
+        self.update = update
+        self._dirty = False
+        self._keys: set = set()
+        self._task: asyncio.Task | None = None
+
+    def schedule(self, *keys):
+        if self.build is None:
+            return
+        if keys and self.update is not None:
+            self._keys.update(keys)
+        else:
+            self._dirty = True
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while self._dirty or self._keys:
+            await asyncio.sleep(self.delay)
+            full, keys = self._dirty, self._keys
+            self._dirty, self._keys = False, set()
+            try:
+                if full:
+                    await run_in_threadpool(self.build)
+                else:
+                    await run_in_threadpool(self.update, keys)
+            except Exception:
+                log.exception("%s failed", (self.build if full else self.update).__name__)
+
+snapshot_scheduler = RebuildScheduler(SNAPSHOT_DEBOUNCE, build_snapshot if SNAPSHOT_DIR else None,
+                                      update_apps)
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    if not SNAPSHOT_DIR:
+        raise SystemExit("set SNAPSHOT_DIR")
+    print(build_snapshot())
@@ -0,0 +1,87 @@
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+import hashlib
+import os
+import tempfile
+
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "./artifacts")
+# when set (e.g. "/_artifacts/"), downloads are handed to nginx via X-Accel-Redirect
+ARTIFACT_ACCEL_PREFIX = os.getenv("ARTIFACT_ACCEL_PREFIX", "")
+CHUNK_SIZE = 1024 * 1024
+MAX_ARTIFACT_BYTES = int(os.getenv("MAX_ARTIFACT_BYTES", str(4 * 1024 ** 3)))
+
+class ArtifactTooLarge(Exception):
+    pass
+
+class DigestMismatch(Exception):
+    pass
+
+def artifact_path(sha256: str) -> str:
+    # content-addressed and fanned out so no directory grows unbounded
+    return os.path.join(ARTIFACT_DIR, *artifact_relpath(sha256).split("/"))
+
+def artifact_relpath(sha256: str) -> str:
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+def temp_path() -> str:
+    os.makedirs(os.path.join(ARTIFACT_DIR, "tmp"), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.join(ARTIFACT_DIR, "tmp"))
+    os.close(fd)
+    return tmp
+
+def commit_file(tmp: str, sha256: str):
+    """Move a fully written temp file to its content address (or drop it as a duplicate)."""
+    path = artifact_path(sha256)
+    if os.path.exists(path):
+        os.unlink(tmp)
+    else:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp, path)
+
+def hash_file(path: str) -> tuple[str, int]:
+    digest, size = hashlib.sha256(), 0
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def _write(f, digest, buf: bytes):
+    digest.update(buf)
+    f.write(buf)
+
+async def store_stream(chunks, expected_sha256: str | None = None) -> tuple[str, int]:
+    """Stream an async byte iterator into the store, hashing as it goes.
+
+    Memory use is bounded by CHUNK_SIZE whatever the artifact size; identical
+    content lands on the same path, so re-uploads are deduplicated.
+    """
+    tmp = temp_path()
+    digest, size, buf = hashlib.sha256(), 0, bytearray()
+    try:
+        with open(tmp, "wb") as f:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > MAX_ARTIFACT_BYTES:
+                    raise ArtifactTooLarge(size)
+                buf += chunk
+                if len(buf) >= CHUNK_SIZE:
+                    await run_in_threadpool(_write, f, digest, bytes(buf))
+                    buf.clear()
+            if buf:
+                await run_in_threadpool(_write, f, digest, bytes(buf))
+        sha256 = digest.hexdigest()
+        if expected_sha256 and expected_sha256.lower() != sha256:
+            raise DigestMismatch(sha256)
+        commit_file(tmp, sha256)
+        return sha256, size
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+class ArtifactResponse(FileResponse):
+    # starlette only honours If-Range against its own mtime-based validator;
+    # artifacts are validated by their content digest instead
+    def _should_use_range(self, http_if_range, stat_result) -> bool:
+        return http_if_range == self.headers.get("etag")
@@ -0,0 +1,182 @@
+"""Download/install telemetry, aggregated in memory and flushed as bulk upserts.
+
+Events are folded into counters keyed by (version_id, event_type, minute) as
+they arrive, so the database sees one additive upsert per key per flush
+however many events hit it. A flush runs every TELEMETRY_FLUSH_INTERVAL
+seconds, or as soon as TELEMETRY_FLUSH_KEYS keys are pending. A crash loses at
+most the counters gathered since the last flush. Counters for version ids that
+do not exist are dropped at flush. A batch the database rejects is split until
+the offending rows are isolated and dropped; when the database cannot be
+reached, the unwritten counters are merged back for the next attempt. Once
+TELEMETRY_MAX_KEYS keys are pending, for example while the database is down,
+new batches are refused and clients retry later. Each worker aggregates separately; the upserts are additive, so
+workers never coordinate.
+"""
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from app.db import async_engine
+from app.models import Version, VersionStat
+import asyncio
+import logging
+import os
+import time
+
+TELEMETRY_FLUSH_INTERVAL = float(os.getenv("TELEMETRY_FLUSH_INTERVAL", "2"))
+TELEMETRY_FLUSH_KEYS = int(os.getenv("TELEMETRY_FLUSH_KEYS", "20000"))
+TELEMETRY_MAX_KEYS = int(os.getenv("TELEMETRY_MAX_KEYS", "200000"))
+# client clocks are trusted this far into the past (offline batches) and the future
+TELEMETRY_MAX_AGE = int(os.getenv("TELEMETRY_MAX_AGE", str(7 * 86400)))
+TELEMETRY_MAX_SKEW = 300
+UPSERT_BATCH = 1000
+
+log = logging.getLogger("app.telemetry")
+
+class Backpressure(Exception):
+    pass
+
+def upsert_statement(dialect: str):
+    if dialect == "mysql":
+        stmt = mysql.insert(VersionStat)
+        return stmt.on_duplicate_key_update(count=VersionStat.count + stmt.inserted["count"])
+    stmt = sqlite.insert(VersionStat)
+    return stmt.on_conflict_do_update(
+        index_elements=[VersionStat.version_id, VersionStat.event_type, VersionStat.minute],
+        set_={"count": VersionStat.count + stmt.excluded["count"]})
+
+class TelemetryAggregator:
+    def __init__(self, engine, flush_interval: float, flush_keys: int, max_keys: int):
+        self.engine = engine
+        self.flush_interval = flush_interval
+        self.flush_keys = flush_keys
+        self.max_keys = max_keys
+        self._counts: dict = {}      # (version_id, event_type, minute) -> count
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._closing = False
+        self._upsert = upsert_statement(engine.dialect.name)
+        self.accepted = self.rejected = self.dropped = self.unknown = 0
+        self.flushes = self.flush_errors = 0
+        self.flush_seconds = 0.0
+
+    def add(self, events) -> int:
+        """Fold a validated batch into the counters; raises Backpressure when full."""
+        if len(self._counts) >= self.max_keys:
+            self.rejected += len(events)
+            raise Backpressure()
+        self._ensure_flusher()
+        counts = self._counts
+        now = int(time.time())
+        oldest, newest = now - TELEMETRY_MAX_AGE, now + TELEMETRY_MAX_SKEW
+        for e in events:
+            ts = e.ts if e.ts is not None and oldest <= e.ts <= newest else now
+            key = (e.version_id, e.event, ts // 60)
+            counts[key] = counts.get(key, 0) + 1
+        self.accepted += len(events)
+        if len(counts) >= self.flush_keys:
+            self._wake.set()
+        return len(events)
+
+    def _ensure_flusher(self):
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._closing = False
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self):
+        if not self._counts:
+            return
+        # swap first: events arriving during the write land in a fresh dict
+        counts, self._counts = self._counts, {}
+        rows = [{"version_id": v, "event_type": t, "minute": m, "count": n}
+                for (v, t, m), n in counts.items()]
+        # holds exactly the rows not yet written, last batch first
+        queue = [rows]
+        start = time.perf_counter()
+        try:
+            rows = await self._known(rows)
+            queue = [rows[i:i + UPSERT_BATCH] for i in range(0, len(rows), UPSERT_BATCH)][::-1]
+            while queue:
+                batch = queue[-1]
+                try:
+                    async with self.engine.begin() as conn:
+                        await conn.execute(self._upsert, batch)
+                except (OperationalError, InterfaceError):
+                    raise
+                except DBAPIError:
+                    # the database refused these rows: retry the halves so one
+                    # bad row costs only itself
+                    queue.pop()
+                    if len(batch) == 1:
+                        self.dropped += batch[0]["count"]
+                        log.warning("telemetry row rejected: %s", batch[0])
+                    else:
+                        queue += [batch[len(batch) // 2:], batch[:len(batch) // 2]]
+                    continue
+                queue.pop()
+        except Exception:
+            self.flush_errors += 1
+            log.exception("telemetry flush of %d keys failed", sum(map(len, queue)))
+            self._merge_back({(r["version_id"], r["event_type"], r["minute"]): r["count"]
+                              for batch in queue for r in batch})
+            return
+        finally:
+            self.flush_seconds += time.perf_counter() - start
+        self.flushes += 1
+
+    async def _known(self, rows: list) -> list:
+        # the table has no foreign key, so ids from clients are checked here
+        ids = list({r["version_id"] for r in rows})
+        known = set()
+        async with self.engine.connect() as conn:
+            for i in range(0, len(ids), UPSERT_BATCH):
+                known.update(await conn.scalars(
+                    select(Version.id).where(Version.id.in_(ids[i:i + UPSERT_BATCH]))))
+        kept = [r for r in rows if r["version_id"] in known]
+        self.unknown += sum(r["count"] for r in rows) - sum(r["count"] for r in kept)
+        return kept
+
+    def _merge_back(self, counts: dict):
+        # keep the failed counters for the next flush while there is room; the
+        # rest is dropped and counted rather than growing without bound
+        pending = self._counts
+        for key, n in counts.items():
+            if key in pending:
+                pending[key] += n
+            elif len(pending) < self.max_keys:
+                pending[key] = n
+            else:
+                self.dropped += n
+
+    async def close(self):
+        # let an in-flight flush finish instead of cancelling it mid-write
+        self._closing = True
+        if self._task is not None and not self._task.done():
+            self._wake.set()
+            await self._task
+        await self.flush()
+
+    def collect(self):
+        for metric, value in (("telemetry_events_accepted_total", self.accepted),
+                              ("telemetry_events_rejected_total", self.rejected),
+                              ("telemetry_events_dropped_total", self.dropped),
+                              ("telemetry_events_unknown_version_total", self.unknown),
+                              ("telemetry_flushes_total", self.flushes),
+                              ("telemetry_flush_errors_total", self.flush_errors),
+                              ("telemetry_flush_seconds_total", round(self.flush_seconds, 6))):
+            yield f"# TYPE {metric} counter"
+            yield f"{metric} {value}"
+        yield "# TYPE telemetry_pending_keys gauge"
+        yield f"telemetry_pending_keys {len(self._counts)}"
+
+telemetry = TelemetryAggregator(async_engine, TELEMETRY_FLUSH_INTERVAL,
+                                TELEMETRY_FLUSH_KEYS, TELEMETRY_MAX_KEYS)
@@ -0,0 +1,145 @@
+"""In-process load test for the catalog and update-check routes.
+
+    cd backend
+    python -m bench.api_bench --db /tmp/bench.db --apps 100000 --versions 2000000 \
+        --concurrency 64 --requests 20000 --out bench.json
+
+The database is seeded once (pass --reseed to rebuild it) and requests are
+driven through the ASGI app with httpx, so results measure the routes and the
+database layer without network noise. The JSON report is meant to be diffed
+across commits.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+PLATFORMS = ("android", "ios", "web")
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--db", default="./bench.db")
+    p.add_argument("--apps", type=int, default=100_000)
+    p.add_argument("--versions", type=int, default=2_000_000)
+    p.add_argument("--reseed", action="store_true")
+    p.add_argument("--concurrency", type=int, default=64)
+    p.add_argument("--requests", type=int, default=20_000, help="per scenario")
+    p.add_argument("--scenarios", default="list_apps,app_detail,latest_version")
+    p.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", default="bench.json")
+    return p.parse_args(argv)
+
+def seed(engine, n_apps: int, n_versions: int, rng: random.Random):
+    from app.importer import import_catalog
+    from app.models import Base
+    Base.metadata.drop_all(engine)
+    users = [{"id": 1, "email": "bench@example.com", "role": "developer", "password_hash": "x"}]
+    apps = ({"id": i, "slug": f"app-{i}", "name": f"Bench App {i}",
+             "description": f"Benchmark application number {i} " * 8, "developer_id": 1}
+            for i in range(1, n_apps + 1))
+    versions = ({"app_id": i % n_apps + 1,
+                 "semver": f"{rng.randint(0, 9)}.{rng.randint(0, 30)}.{rng.randint(0, 99)}",
+                 "platform": PLATFORMS[(i // n_apps) % 3],
+                 "file_url": f"/api/versions/{i + 1}/artifact", "file_sha256": "0" * 64,
+                 "release_notes": "Bug fixes and performance improvements.",
+                 "published": rng.random() < 0.9}
+                for i in range(n_versions))
+    import_catalog(engine, [("users", users), ("apps", apps), ("versions", versions)])
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+async def run_scenario(client, make_url, n_requests: int, concurrency: int):
+    latencies, errors = [], 0
+    remaining = iter(range(n_requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            url = make_url()
+            start = time.perf_counter()
+            r = await client.get(url)
+            latencies.append(time.perf_counter() - start)
+            if r.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "requests": n_requests,
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(n_requests / elapsed, 1),
+        "latency_ms": {k: round(percentile(latencies, q) * 1000, 3)
+                       for k, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))},
+    }
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main(args):
+    import httpx
+    from app.db import engine
+    from app.main import app
+    from app.models import App
+    from sqlalchemy import func, select
+
+    rng = random.Random(args.seed)
+    with engine.connect() as conn:
+        have = conn.execute(select(func.count()).select_from(App)).scalar() if \
+            engine.dialect.has_table(conn, "apps") else 0
+    if args.reseed or have != args.apps:
+        start = time.perf_counter()
+        seed(engine, args.apps, args.versions, rng)
+        print(f"seeded {args.apps} apps / {args.versions} versions in "
+              f"{time.perf_counter() - start:.1f}s", file=sys.stderr)
+
+    scenarios = {
+        "list_apps": lambda: f"/api/apps?limit=50&cursor={rng.randint(0, args.apps)}",
+        "app_detail": lambda: f"/api/apps/app-{rng.randint(1, args.apps)}",
+        "latest_version": lambda: (f"/api/versions/app-{rng.randint(1, args.apps)}/latest"
+                                   f"?platform={rng.choice(PLATFORMS)}"),
+    }
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "params": {k: v for k, v in vars(args).items() if k != "out"},
+        "scenarios": {},
+    }
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name in args.scenarios.split(","):
+            await run_scenario(client, scenarios[name], min(200, args.requests), args.concurrency)
+            report["scenarios"][name] = await run_scenario(
+                client, scenarios[name], args.requests, args.concurrency)
+            print(name, json.dumps(report["scenarios"][name]), file=sys.stderr)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+if __name__ == "__main__":
+    args = parse_args()
+    # configure the app before it is imported
+    os.environ["DB_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    if args.no_cache:
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    # queueing under load trips the default threshold on every query
+    os.environ.setdefault("SLOW_QUERY_MS", "1000")
+    # tokens are never issued here
+    os.environ.setdefault("APP_ENV", "dev")
+    # every request comes from one in-process client; don't rate limit it
+    os.environ.setdefault("RATE_LIMIT_RPS", "0")
+    asyncio.run(main(args))
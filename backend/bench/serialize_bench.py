@@ -0,0 +1,88 @@
+"""Per-request serialization cost of catalog and update-check payloads.
+
+    cd backend
+    python -m bench.serialize_bench --out serialize.json
+
+"before" is the stdlib path the routes used to take (model_dump or FastAPI's
+response_model validation and serialization, rendered by JSONResponse);
+"after" is FastJSONResponse rendering the typed models directly. Both are
+checked to produce the same JSON document. No database is involved.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+
+from bench.api_bench import git_commit
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    p.add_argument("--iterations", type=int, default=2000)
+    p.add_argument("--out", default="serialize.json")
+    return p.parse_args(argv)
+
+def payloads():
+    from app.schemas import AppDetail, AppPage, AppSummary, DeveloperSummary, UpdateInfo
+    def page(n):
+        return AppPage(items=[AppSummary(id=i, slug=f"app-{i}", name=f"Bench App {i}")
+                              for i in range(1, n + 1)], next_cursor=n)
+    detail = AppDetail(id=1, slug="app-1", name="Bench App 1",
+                       description="Benchmark application number 1 " * 8, developer_id=1,
+                       developer=DeveloperSummary(id=1))
+    updates = [UpdateInfo(slug=f"app-{i}", platform="android", installed="1.0.0",
+                          semver="1.2.3", file_url=f"/api/versions/{i}/artifact",
+                          file_sha256="0" * 64,
+                          release_notes="Bug fixes and performance improvements.")
+               for i in range(500)]
+    return {"list_apps_50": page(50), "list_apps_500": page(500),
+            "app_detail": detail, "check_updates_500": updates}
+
+async def measure(render, iterations: int) -> dict:
+    for _ in range(min(100, iterations)):
+        await render()
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await render()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {"p50_us": round(timings[len(timings) // 2] * 1e6, 1),
+            "mean_us": round(sum(timings) / len(timings) * 1e6, 1)}
+
+async def main(args):
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_model_field
+    from app.responses import FastJSONResponse
+    from app.schemas import UpdateInfo
+
+    updates_field = create_model_field("updates", list[UpdateInfo], mode="serialization")
+
+    async def before(name, payload):
+        if name.startswith("check_updates"):
+            # response_model route: validate, serialize, then render
+            content = await serialize_response(field=updates_field, response_content=payload)
+            return JSONResponse(content).body
+        return JSONResponse(payload.model_dump()).body
+
+    async def after(name, payload):
+        return FastJSONResponse(payload).body
+
+    report = {"commit": git_commit(), "python": platform.python_version(),
+              "params": {"iterations": args.iterations}, "payloads": {}}
+    for name, payload in payloads().items():
+        old, new = await before(name, payload), await after(name, payload)
+        assert json.loads(old) == json.loads(new), name
+        result = {"bytes": len(new),
+                  "before": await measure(lambda: before(name, payload), args.iterations),
+                  "after": await measure(lambda: after(name, payload), args.iterations)}
+        result["speedup"] = round(result["before"]["mean_us"] / result["after"]["mean_us"], 1)
+        report["payloads"][name] = result
+        print(name, json.dumps(result), file=sys.stderr)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
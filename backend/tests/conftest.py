@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+# the app reads its configuration at import time
+_tmp = tempfile.mkdtemp(prefix="appstore-tests-")
+os.environ.update({
+    "DB_URL": f"sqlite:///{_tmp}/test.db",
+    "ARTIFACT_DIR": f"{_tmp}/artifacts",
+    "JWT_SECRET": "test-secret",
+    "RATE_LIMIT_RPS": "0",
+    "SLOW_QUERY_MS": "10000",
+})
+for name in ("DB_REPLICA_URLS", "SNAPSHOT_DIR", "CATALOG_INDEX_PATH", "ARTIFACT_ACCEL_PREFIX"):
+    os.environ.pop(name, None)
+
+import pytest
+import shutil
+from fastapi.testclient import TestClient
+from app.cache import response_cache
+from app.db import SessionLocal, engine
+from app.main import app
+from app.models import Base
+from app.storage import ARTIFACT_DIR
+
+@pytest.fixture(autouse=True)
+def schema():
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    response_cache.clear()
+    shutil.rmtree(ARTIFACT_DIR, ignore_errors=True)
+    yield
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+
+@pytest.fixture
+def db():
+    with SessionLocal() as session:
+        yield session
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def engine_conn():
+    # raw writes that bypass the ORM session events, as another process's would
+    def execute(sql: str):
+        with engine.begin() as conn:
+            conn.exec_driver_sql(sql)
+    return execute
@@ -0,0 +1,24 @@
+"""Row builders shared by the tests; they commit through a sync session."""
+from app.models import App, User, Version
+from app.security import ACCESS_TOKEN_TTL, create_token
+
+def add_app(db, slug: str, developer: User, *versions: str, platform: str = "android",
+            published: bool = True) -> App:
+    app_ = App(slug=slug, name=slug.title(), description=f"{slug} description",
+               developer_id=developer.id)
+    db.add(app_)
+    db.flush()
+    for semver in versions:
+        db.add(Version(app_id=app_.id, semver=semver, platform=platform, file_url="",
+                       file_sha256="", release_notes=f"notes {semver}", published=published))
+    db.commit()
+    return app_
+
+def add_developer(db, email: str = "dev@example.com", role: str = "developer") -> User:
+    user = User(email=email, role=role, password_hash="x")
+    db.add(user)
+    db.commit()
+    return user
+
+def auth(user: User) -> dict:
+    return {"Authorization": "Bearer " + create_token(user.id, "access", user.role, ACCESS_TOKEN_TTL)}
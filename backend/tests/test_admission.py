@@ -0,0 +1,64 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.middleware import AdmissionMiddleware
+from app.ratelimit import InMemoryRateLimitStore, RateLimitStore
+import asyncio
+import httpx
+import pytest
+
+def test_store_is_abstract():
+    with pytest.raises(TypeError):
+        RateLimitStore()
+    class Incomplete(RateLimitStore):
+        pass
+    with pytest.raises(TypeError):
+        Incomplete()
+
+@pytest.mark.anyio
+async def test_bucket_grants_burst_then_reports_the_wait():
+    store = InMemoryRateLimitStore()
+    assert [await store.take("a", 10, 3) for _ in range(3)] == [0, 0, 0]
+    assert 0 < await store.take("a", 10, 3) <= 0.1
+    assert await store.take("b", 10, 3) == 0
+
+@pytest.mark.anyio
+async def test_least_recently_seen_client_is_evicted():
+    store = InMemoryRateLimitStore(max_clients=2)
+    for key in ("a", "b", "a", "c"):
+        await store.take(key, 1, 1)
+    assert list(store._buckets) == ["a", "c"]
+
+def admitted(**kw):
+    api = FastAPI()
+
+    @api.get("/slow")
+    async def slow():
+        await asyncio.sleep(0.2)
+        return {}
+
+    @api.get("/fast")
+    async def fast():
+        return {}
+
+    @api.get("/api/health")
+    async def health():
+        return {}
+
+    options = dict(store=InMemoryRateLimitStore(), rate=0, burst=0, max_concurrency=100,
+                   max_queue=100, queue_timeout=1)
+    api.add_middleware(AdmissionMiddleware, **{**options, **kw})
+    return TestClient(api)
+
+def test_rate_limited_client_gets_429_with_retry_after():
+    with admitted(rate=1, burst=2) as client:
+        assert [client.get("/fast").status_code for _ in range(3)] == [200, 200, 429]
+        assert client.get("/fast").headers["Retry-After"] == "1"
+        assert client.get("/fast", headers={"X-Forwarded-For": "10.0.0.2"}).status_code == 200
+        assert client.get("/api/health").status_code == 200
+
+@pytest.mark.anyio
+async def test_full_queue_sheds_with_503():
+    api = admitted(max_concurrency=1, max_queue=1, queue_timeout=5).app
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://t") as c:
+        codes = await asyncio.gather(*(c.get("/slow") for _ in range(3)))
+    assert sorted(r.status_code for r in codes) == [200, 200, 503]
@@ -0,0 +1,64 @@
+from sqlalchemy import select
+from app.models import Version
+from app.storage import ARTIFACT_DIR, artifact_path
+from factories import add_app, add_developer, auth
+import hashlib
+import os
+import pytest
+
+BLOB = os.urandom(3 * 1024 * 1024 + 17)
+SHA = hashlib.sha256(BLOB).hexdigest()
+
+@pytest.fixture
+def owner(db):
+    return add_developer(db, "owner@example.com")
+
+@pytest.fixture
+def version_id(db, owner):
+    app_ = add_app(db, "foo", owner, "1.0.0")
+    return db.scalar(select(Version.id).where(Version.app_id == app_.id))
+
+def upload(client, version_id, headers=None, body=BLOB):
+    return client.put(f"/api/versions/{version_id}/artifact", content=body, headers=headers or {})
+
+def leftover_temp_files():
+    tmp = os.path.join(ARTIFACT_DIR, "tmp")
+    return os.listdir(tmp) if os.path.isdir(tmp) else []
+
+def test_upload_requires_a_token(client, version_id):
+    assert upload(client, version_id).status_code == 401
+
+def test_upload_requires_the_developer_role(client, db, version_id):
+    user = add_developer(db, "user@example.com", role="user")
+    assert upload(client, version_id, auth(user)).status_code == 403
+
+def test_upload_to_another_developers_app_is_refused(client, db, version_id):
+    other = add_developer(db, "other@example.com")
+    assert upload(client, version_id, auth(other)).status_code == 403
+    assert not os.path.exists(artifact_path(SHA))
+
+def test_owner_uploads_and_downloads(client, db, owner, version_id):
+    r = upload(client, version_id, {**auth(owner), "X-Content-SHA256": SHA})
+    assert r.status_code == 200
+    assert r.json() == {"file_url": f"/api/versions/{version_id}/artifact",
+                        "file_sha256": SHA, "size": len(BLOB)}
+    with open(artifact_path(SHA), "rb") as f:
+        assert f.read() == BLOB
+    r = client.get(f"/api/versions/{version_id}/artifact", headers={"Range": "bytes=10-19"})
+    assert r.status_code == 206
+    assert r.content == BLOB[10:20]
+    assert client.get(f"/api/versions/{version_id}/artifact",
+                      headers={"If-None-Match": f'"{SHA}"'}).status_code == 304
+
+def test_admin_may_upload_to_any_app(client, db, version_id):
+    admin = add_developer(db, "admin@example.com", role="admin")
+    assert upload(client, version_id, auth(admin)).status_code == 200
+
+def test_digest_mismatch_leaves_no_blob(client, owner, version_id):
+    r = upload(client, version_id, {**auth(owner), "X-Content-SHA256": "0" * 64})
+    assert r.status_code == 400
+    assert not os.path.exists(artifact_path(SHA))
+    assert leftover_temp_files() == []
+
+def test_upload_to_missing_version(client, owner):
+    assert upload(client, 999, auth(owner)).status_code == 404
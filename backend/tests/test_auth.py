@@ -0,0 +1,110 @@
+from app import security
+from app.models import User
+from app.security import (ACCESS_TOKEN_TTL, TokenError, _b64, _unb64, create_token,
+                          decode_token, hash_password)
+from factories import add_developer, auth
+import json
+import pytest
+
+PASSWORD = "correct horse battery staple"
+
+@pytest.fixture(scope="module")
+def password_hash():
+    # bcrypt is slow on purpose; hash once for the module
+    return hash_password(PASSWORD)
+
+@pytest.fixture
+def user(db, password_hash):
+    user = User(email="dev@example.com", role="developer", password_hash=password_hash)
+    db.add(user)
+    db.commit()
+    return user
+
+def login(client, email, password):
+    return client.post("/api/auth/login", json={"email": email, "password": password})
+
+def test_login_issues_access_and_refresh_tokens(client, user):
+    r = login(client, "dev@example.com", PASSWORD)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["token_type"] == "bearer" and body["expires_in"] == ACCESS_TOKEN_TTL
+    claims = decode_token(body["token"], "access")
+    assert (claims["sub"], claims["role"]) == (str(user.id), "developer")
+    assert decode_token(body["refresh_token"], "refresh")["sub"] == str(user.id)
+
+@pytest.mark.parametrize("email,password", [("dev@example.com", "wrong"),
+                                            ("nobody@example.com", PASSWORD)])
+def test_bad_credentials_are_401(client, user, email, password):
+    r = login(client, email, password)
+    assert r.status_code == 401
+    assert r.json() == {"detail": "invalid credentials"}
+
+def test_refresh_issues_a_new_access_token(client, user):
+    refresh_token = login(client, "dev@example.com", PASSWORD).json()["refresh_token"]
+    r = client.post("/api/auth/refresh", json={"refresh_token": refresh_token})
+    assert r.status_code == 200
+    assert decode_token(r.json()["token"], "access")["sub"] == str(user.id)
+
+def test_refresh_refuses_an_access_token(client, user):
+    access_token = login(client, "dev@example.com", PASSWORD).json()["token"]
+    r = client.post("/api/auth/refresh", json={"refresh_token": access_token})
+    assert r.status_code == 401
+    assert r.json() == {"detail": "wrong token type"}
+
+def test_refresh_token_is_not_a_bearer_token(client):
+    refresh_token = create_token(1, "refresh", "developer", 60)
+    r = client.get("/api/versions/1/stats", headers={"Authorization": f"Bearer {refresh_token}"})
+    assert r.status_code == 401
+    assert r.json() == {"detail": "wrong token type"}
+
+def _tamper(token: str, part: int, change) -> str:
+    parts = token.split(".")
+    parts[part] = _b64(json.dumps(change(json.loads(_unb64(parts[part])))).encode())
+    return ".".join(parts)
+
+@pytest.mark.parametrize("forge", [
+    lambda t: _tamper(t, 1, lambda c: {**c, "role": "admin"}),
+    lambda t: _tamper(t, 0, lambda h: {**h, "alg": "none"}),
+    lambda t: t.rpartition(".")[0] + "." + _b64(b"\0" * 32),
+    lambda t: t.rpartition(".")[0] + ".",
+    lambda t: "not-a-token",
+    lambda t: "a.b.%%%",
+])
+def test_forged_or_malformed_tokens_are_rejected(forge):
+    token = create_token(1, "access", "developer", 60)
+    with pytest.raises(TokenError):
+        decode_token(forge(token), "access")
+
+def test_token_signed_with_another_secret_is_rejected(monkeypatch):
+    monkeypatch.setattr(security, "JWT_SECRET", b"another-secret")
+    token = create_token(1, "access", "admin", 60)
+    monkeypatch.undo()
+    with pytest.raises(TokenError, match="bad signature"):
+        decode_token(token, "access")
+
+def test_expired_token_is_rejected(client):
+    token = create_token(1, "access", "developer", -1)
+    with pytest.raises(TokenError, match="token expired"):
+        decode_token(token, "access")
+    r = client.get("/api/versions/1/stats", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 401
+    assert r.json() == {"detail": "token expired"}
+
+def test_cached_token_still_expires(monkeypatch):
+    now = 1_000_000.0
+    monkeypatch.setattr(security.time, "time", lambda: now)
+    token = create_token(1, "access", "developer", 60)
+    assert decode_token(token, "access")["sub"] == "1"
+    assert security._verified.get(token) is not None
+    now += 61
+    with pytest.raises(TokenError, match="token expired"):
+        decode_token(token, "access")
+
+def test_missing_token_is_401_with_challenge(client):
+    r = client.get("/api/versions/1/stats")
+    assert r.status_code == 401
+    assert r.headers["WWW-Authenticate"] == "Bearer"
+
+def test_user_role_cannot_act_as_developer(client, db):
+    user = add_developer(db, "user@example.com", role="user")
+    assert client.get("/api/versions/1/stats", headers=auth(user)).status_code == 403
@@ -0,0 +1,53 @@
+from app import cache
+from app.cache import ResponseCache, fill_bind, response_cache
+from app.db import async_engine
+from factories import add_app, add_developer
+import pytest
+
+@pytest.fixture
+def revision_check_due(monkeypatch):
+    def due():
+        monkeypatch.setattr(cache, "_next_revision_check", 0.0)
+    due()
+    return due
+
+def test_commit_in_another_worker_empties_the_cache(client, db, engine_conn, revision_check_due):
+    add_app(db, "foo", add_developer(db), "1.0.0")
+    assert client.get("/api/apps/foo").json()["name"] == "Foo"
+    changes = response_cache.revision_changes
+    # another worker's commit: the row and the revision change, but no
+    # session event fires in this process
+    engine_conn("UPDATE apps SET name = 'Renamed' WHERE slug = 'foo'")
+    assert client.get("/api/apps/foo").json()["name"] == "Foo"
+    engine_conn("UPDATE catalog_revision SET value = value + 1")
+    revision_check_due()
+    assert client.get("/api/apps/foo").json()["name"] == "Renamed"
+    assert response_cache.revision_changes == changes + 1
+
+def test_latest_version_sees_another_workers_publish(client, db, engine_conn, revision_check_due):
+    add_app(db, "foo", add_developer(db), "1.0.0")
+    url = "/api/versions/foo/latest?platform=android"
+    assert client.get(url).json()["semver"] == "1.0.0"
+    engine_conn("UPDATE versions SET semver = '1.1.0', minor = 1")
+    engine_conn("UPDATE catalog_revision SET value = value + 1")
+    revision_check_due()
+    assert client.get(url).json()["semver"] == "1.1.0"
+
+def test_revision_change_discards_fills_started_before_it():
+    c = ResponseCache(maxsize=10, ttl=60)
+    c.observe_revision(1)
+    generation = c.generation
+    c.observe_revision(2)
+    c.set("k", "stale", (), generation)
+    assert c.get("k") is cache.MISS
+
+def test_fills_read_the_primary_after_an_invalidation(monkeypatch):
+    replica = object()
+    monkeypatch.setattr(cache, "async_read_bind", lambda request=None: replica)
+    monkeypatch.setattr(response_cache, "primary_window", 5)
+    monkeypatch.setattr(response_cache, "_primary_until", 0.0)
+    assert fill_bind() is replica
+    response_cache.invalidate(("slug", "foo"))
+    assert fill_bind() is async_engine
+    monkeypatch.setattr(response_cache, "_primary_until", 0.0)
+    assert fill_bind() is replica
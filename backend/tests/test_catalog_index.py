@@ -0,0 +1,109 @@
+from fastapi.testclient import TestClient
+from app import catalog_index as ci, main
+from app.catalog_index import (HEADER, MAGIC, CatalogIndex, build_index, catalog_index, ensure_index,
+                               update_index, write_index)
+from app.models import Version
+from factories import add_app, add_developer
+import errno
+import time
+import json
+import os
+import pytest
+
+@pytest.fixture
+def no_space(monkeypatch):
+    def replace(src, dst):
+        raise OSError(errno.ENOSPC, "No space left on device")
+    monkeypatch.setattr(os, "replace", replace)
+
+def records(n):
+    return [(b"k%d" % i, '"e%d"' % i, b"body %d" % i) for i in range(n)]
+
+def test_write_then_lookup(tmp_path):
+    path = str(tmp_path / "catalog.idx")
+    assert write_index(path, 7, records(100)) == 100
+    index = CatalogIndex(path, 0)
+    for key, etag, body in records(100):
+        assert index.get(key) == (etag, body)
+    assert index.get(b"missing") is None
+    assert index.revision == 7
+    assert (index.hits, index.misses) == (100, 1)
+
+def test_colliding_hashes_probe_to_the_right_record(tmp_path, monkeypatch):
+    # three distinct hashes for twenty keys: every lookup walks a probe chain
+    monkeypatch.setattr(ci, "_hash", lambda key: key[-1] % 3 + 1)
+    path = str(tmp_path / "catalog.idx")
+    write_index(path, 1, records(20))
+    index = CatalogIndex(path, 0)
+    for key, etag, body in records(20):
+        assert index.get(key) == (etag, body)
+    assert index.get(b"k99") is None
+
+def test_bad_magic_is_rejected(tmp_path):
+    path = tmp_path / "catalog.idx"
+    path.write_bytes(HEADER.pack(b"NOTANIDX", 1, 16) + bytes(16 * 24))
+    with pytest.raises(ValueError):
+        CatalogIndex(str(path), 0).get(b"k0")
+
+def test_remaps_after_replace(tmp_path):
+    path = str(tmp_path / "catalog.idx")
+    write_index(path, 1, [(b"k", '"old"', b"old")])
+    index = CatalogIndex(path, 0)
+    assert index.get(b"k") == ('"old"', b"old")
+    write_index(path, 2, [(b"k", '"new"', b"new")])
+    assert index.get(b"k") == ('"new"', b"new")
+    assert (index.revision, index.reloads) == (2, 2)
+
+def test_update_rerenders_only_the_changed_app(tmp_path, db):
+    dev = add_developer(db)
+    foo = add_app(db, "foo", dev, "1.0.0")
+    add_app(db, "bar", dev, "2.0.0")
+    path = str(tmp_path / "catalog.idx")
+    build_index(path)
+    index = CatalogIndex(path, 0)
+    bar = index.app("bar"), index.latest("bar", "android")
+    db.add_all([Version(app_id=foo.id, semver="1.1.0", platform="android", file_url="",
+                        file_sha256="", release_notes="", published=True),
+                Version(app_id=foo.id, semver="1.0.0", platform="ios", file_url="",
+                        file_sha256="", release_notes="", published=True)])
+    db.commit()
+    assert update_index([foo.id], path) == 3
+    assert json.loads(index.latest("foo", "android")[1])["semver"] == "1.1.0"
+    assert json.loads(index.latest("foo", "ios")[1])["semver"] == "1.0.0"
+    assert (index.app("bar"), index.latest("bar", "android")) == bar
+    assert index.reloads == 2
+
+def test_update_without_an_index_is_skipped(tmp_path, db):
+    foo = add_app(db, "foo", add_developer(db), "1.0.0")
+    path = tmp_path / "catalog.idx"
+    assert update_index([foo.id], str(path)) == 0
+    assert not path.exists()
+
+def test_pinned_reads_bypass_the_index(tmp_path, db, client, monkeypatch):
+    add_app(db, "foo", add_developer(db), "1.0.0")
+    path = str(tmp_path / "catalog.idx")
+    write_index(path, 1, [(ci.app_key("foo"), '"stale"', b'{"slug": "stale"}')])
+    monkeypatch.setattr(catalog_index, "path", path)
+    monkeypatch.setattr(catalog_index, "check_interval", 0)
+    assert client.get("/api/apps/foo").json()["slug"] == "stale"
+    # a client that just wrote reads its own write, not the shared index
+    client.cookies.set("db_pin", str(time.time() + 2))
+    assert client.get("/api/apps/foo").json()["slug"] == "foo"
+
+def test_failed_build_leaves_no_files(tmp_path, db, no_space):
+    path = tmp_path / "catalog.idx"
+    # an index from an older revision
+    path.write_bytes(HEADER.pack(MAGIC, 99, 16) + bytes(16 * 24))
+    with pytest.raises(OSError):
+        ensure_index(str(path))
+    # only the lock file, which takes no space
+    assert os.listdir(tmp_path) == ["catalog.idx.lock"]
+
+def test_worker_starts_without_the_index_when_the_build_fails(tmp_path, db, no_space, monkeypatch):
+    add_app(db, "foo", add_developer(db), "1.0.0")
+    path = str(tmp_path / "catalog.idx")
+    monkeypatch.setattr(main, "CATALOG_INDEX_PATH", path)
+    monkeypatch.setattr(main, "ensure_index", lambda: ensure_index(path))
+    monkeypatch.setattr(catalog_index, "path", path)
+    with TestClient(main.app) as client:
+        assert client.get("/api/apps/foo").json()["slug"] == "foo"
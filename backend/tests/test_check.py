@@ -0,0 +1,41 @@
+from app.models import Version
+from factories import add_app, add_developer
+
+def check(client, *installed):
+    return client.post("/api/versions/check", json={"installed": [
+        {"slug": slug, "platform": platform, "semver": semver}
+        for slug, platform, semver in installed]})
+
+def test_check_returns_only_newer_releases(client, db):
+    dev = add_developer(db)
+    add_app(db, "foo", dev, "1.0.0", "1.2.0")
+    add_app(db, "bar", dev, "3.0.0")
+    add_app(db, "baz", dev, "1.0.0", platform="ios")
+    r = check(client, ("foo", "android", "1.0.0"), ("bar", "android", "3.0.0"),
+              ("baz", "ios", "0.9.0"), ("missing", "android", "1.0.0"))
+    assert r.status_code == 200
+    assert sorted((u["slug"], u["installed"], u["semver"]) for u in r.json()) == [
+        ("baz", "0.9.0", "1.0.0"), ("foo", "1.0.0", "1.2.0")]
+
+def test_check_matches_platform(client, db):
+    dev = add_developer(db)
+    add_app(db, "foo", dev, "2.0.0", platform="ios")
+    add_app(db, "foo-android", dev, "1.0.0")
+    assert check(client, ("foo", "android", "1.0.0")).json() == []
+
+def test_check_ignores_unpublished(client, db):
+    app_ = add_app(db, "foo", add_developer(db), "1.0.0")
+    db.add(Version(app_id=app_.id, semver="2.0.0", platform="android", file_url="",
+                   file_sha256="", release_notes="", published=False))
+    db.commit()
+    assert check(client, ("foo", "android", "1.0.0")).json() == []
+
+def test_check_empty_manifest(client):
+    assert check(client).json() == []
+
+def test_check_rejects_invalid_semver(client):
+    assert check(client, ("foo", "android", "not-a-version")).status_code == 422
+
+def test_check_rejects_oversized_manifest(client):
+    installed = [(f"app-{i}", "android", "1.0.0") for i in range(501)]
+    assert check(client, *installed).status_code == 422
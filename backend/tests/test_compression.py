@@ -0,0 +1,122 @@
+from fastapi import FastAPI, Request
+from fastapi.responses import Response, StreamingResponse
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app.compression import Compressor, negotiate
+from app.conditional import etag_body_response
+from app.middleware import CompressionMiddleware
+from factories import add_app, add_developer
+import gzip
+import pytest
+
+BODY = b'{"items": "%s"}' % (b"x" * 2000)
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, br", "br"),
+    ("gzip", "gzip"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("br;q=0, gzip;q=0.1", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+    ("*", "br"),
+    ("*;q=0.5, br;q=0", "gzip"),
+    ("gzip;q=0, *", "br"),
+    ("identity", None),
+    ("br;q=bogus", None),
+    ("", None),
+])
+def test_negotiate(header, expected):
+    assert negotiate(header) == expected
+
+def compressed(compressor):
+    api = FastAPI()
+
+    @api.get("/etag")
+    def etag(request: Request):
+        return etag_body_response(request, '"abc"', BODY)
+
+    @api.get("/plain")
+    def plain():
+        return Response(BODY, media_type="application/json")
+
+    @api.get("/small")
+    def small():
+        return Response(b"{}", media_type="application/json")
+
+    @api.get("/binary")
+    def binary():
+        return Response(BODY, media_type="application/octet-stream")
+
+    @api.get("/stream")
+    def stream():
+        return StreamingResponse(iter([BODY, BODY]), media_type="application/json")
+
+    api.add_middleware(CompressionMiddleware, compressor=compressor, minimum_size=512)
+    return TestClient(api)
+
+@pytest.fixture
+def compressor():
+    return Compressor(1 << 20)
+
+def test_compresses_with_the_negotiated_encoding(compressor):
+    client = compressed(compressor)
+    r = client.get("/plain", headers={"Accept-Encoding": "br"})
+    assert r.headers["content-encoding"] == "br"
+    assert r.headers["vary"] == "Accept-Encoding"
+    assert int(r.headers["content-length"]) < len(BODY)
+    r = client.get("/plain", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.content == BODY
+
+def test_refused_encodings_get_identity(compressor):
+    r = compressed(compressor).get("/plain", headers={"Accept-Encoding": "br;q=0, gzip;q=0"})
+    assert "content-encoding" not in r.headers
+    assert r.content == BODY
+
+@pytest.mark.parametrize("path, body", [
+    ("/small", b"{}"),        # below the minimum size
+    ("/binary", BODY),        # not JSON or text
+    ("/stream", BODY + BODY), # streamed, more_body set
+])
+def test_passes_through_untouched(compressor, path, body):
+    r = compressed(compressor).get(path, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+    assert r.content == body
+
+def test_etag_becomes_weak_and_revalidates(compressor):
+    client = compressed(compressor)
+    r = client.get("/etag", headers={"Accept-Encoding": "br"})
+    assert r.headers["etag"] == 'W/"abc"'
+    r = client.get("/etag", headers={"Accept-Encoding": "br", "If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
+    # the identity representation keeps its strong ETag
+    assert client.get("/etag", headers={"Accept-Encoding": "identity"}).headers["etag"] == '"abc"'
+
+def test_compressed_bodies_with_an_etag_are_cached(compressor):
+    client = compressed(compressor)
+    for _ in range(2):
+        r = client.get("/etag", headers={"Accept-Encoding": "br"})
+        assert r.content == BODY
+    assert (compressor.misses, compressor.hits) == (1, 1)
+    # without an ETag the body could change, so it is compressed every time
+    client.get("/plain", headers={"Accept-Encoding": "br"})
+    client.get("/plain", headers={"Accept-Encoding": "br"})
+    assert (compressor.misses, compressor.hits) == (1, 1)
+
+def test_cache_evicts_least_recently_used():
+    size = len(gzip.compress(BODY, 9, mtime=0))
+    compressor = Compressor(2 * size)
+    for etag in ('"a"', '"b"', '"a"', '"c"'):
+        assert gzip.decompress(compressor.compress(BODY, "gzip", etag)) == BODY
+    assert list(compressor._data) == [('"a"', "gzip"), ('"c"', "gzip")]
+    assert compressor.stats()["evictions"] == 1
+
+def test_app_detail_is_compressed_and_revalidates(client, db):
+    add_app(db, "foo", add_developer(db), "1.0.0")
+    db.execute(text("UPDATE apps SET description = :d"), {"d": "d" * 2000})
+    db.commit()
+    r = client.get("/api/apps/foo", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.headers["etag"].startswith('W/"')
+    r = client.get("/api/apps/foo", headers={"Accept-Encoding": "gzip",
+                                             "If-None-Match": r.headers["etag"]})
+    assert r.status_code == 304
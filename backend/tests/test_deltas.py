@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select
+from app import deltas
+from app.models import Patch, Version
+from app.storage import ARTIFACT_DIR
+from factories import add_app, add_developer, auth
+import bsdiff4
+import hashlib
+import os
+import pytest
+import random
+
+@pytest.fixture(autouse=True)
+def in_process_deltas(monkeypatch):
+    with ThreadPoolExecutor(1) as pool:
+        monkeypatch.setattr(deltas, "_executor", lambda: pool)
+        yield
+
+@pytest.fixture
+def owner(db):
+    return add_developer(db, "owner@example.com")
+
+@pytest.fixture
+def versions(db, owner):
+    app_ = add_app(db, "foo", owner, "1.0.0", "1.1.0", "1.2.0", "2.0.0", published=False)
+    return dict(db.execute(select(Version.semver, Version.id).where(Version.app_id == app_.id)).all())
+
+def release_blob(n: int) -> bytes:
+    # mostly shared content, so consecutive releases diff well
+    rng = random.Random(0)
+    base = bytearray(rng.randbytes(256 * 1024))
+    base[n * 1000:n * 1000 + 64] = bytes([n]) * 64
+    return bytes(base)
+
+def upload_and_publish(client, owner, version_id, blob):
+    assert client.put(f"/api/versions/{version_id}/artifact", content=blob,
+                      headers=auth(owner)).status_code == 200
+    return client.post(f"/api/versions/{version_id}/publish", headers=auth(owner))
+
+def patches(db, to_version_id):
+    db.expire_all()
+    return {p.from_version_id: p for p in db.scalars(
+        select(Patch).where(Patch.to_version_id == to_version_id))}
+
+def blob_count():
+    return sum(len(files) for root, _, files in os.walk(ARTIFACT_DIR) if not root.endswith("tmp"))
+
+def test_publish_requires_the_owner(client, db, owner, versions):
+    url = f"/api/versions/{versions['1.0.0']}/publish"
+    assert client.post(url).status_code == 401
+    assert client.post(url, headers=auth(add_developer(db, "other@example.com"))).status_code == 403
+
+def test_publish_without_an_artifact_conflicts(client, owner, versions):
+    r = client.post(f"/api/versions/{versions['1.0.0']}/publish", headers=auth(owner))
+    assert r.status_code == 409
+
+def test_publish_builds_patches_from_previous_releases(client, db, owner, versions):
+    for n, semver in enumerate(("1.0.0", "1.1.0", "1.2.0", "2.0.0")):
+        assert upload_and_publish(client, owner, versions[semver], release_blob(n)).status_code == 200
+    built = patches(db, versions["2.0.0"])
+    assert set(built) == {versions["1.0.0"], versions["1.1.0"], versions["1.2.0"]}
+    r = client.get("/api/versions/foo/latest?platform=android&from=1.1.0")
+    assert r.json()["patch"]["url"] == f"/api/versions/{versions['2.0.0']}/patches/{versions['1.1.0']}"
+    patch = client.get(r.json()["patch"]["url"]).content
+    assert bsdiff4.patch(release_blob(1), patch) == release_blob(3)
+
+def test_oversized_patch_is_not_stored(client, db, owner, versions):
+    upload_and_publish(client, owner, versions["1.0.0"], os.urandom(64 * 1024))
+    upload_and_publish(client, owner, versions["1.1.0"], os.urandom(64 * 1024))
+    assert patches(db, versions["1.1.0"]) == {}
+    assert blob_count() == 2
+    assert os.listdir(os.path.join(ARTIFACT_DIR, "tmp")) == []
+
+def test_one_failed_pair_keeps_the_others(client, db, owner, versions, monkeypatch):
+    blobs = {semver: release_blob(n) for n, semver in enumerate(("1.0.0", "1.1.0", "1.2.0", "2.0.0"))}
+    for semver in ("1.0.0", "1.1.0", "1.2.0"):
+        upload_and_publish(client, owner, versions[semver], blobs[semver])
+    make_patch, bad = deltas._make_patch, hashlib.sha256(blobs["1.1.0"]).hexdigest()
+    def flaky(old_sha256, new_sha256, max_size):
+        if old_sha256 == bad:
+            raise RuntimeError("bsdiff failed")
+        return make_patch(old_sha256, new_sha256, max_size)
+    monkeypatch.setattr(deltas, "_make_patch", flaky)
+    upload_and_publish(client, owner, versions["2.0.0"], blobs["2.0.0"])
+    assert set(patches(db, versions["2.0.0"])) == {versions["1.0.0"], versions["1.2.0"]}
+
+def test_reupload_replaces_patches_built_from_the_old_bytes(client, db, owner, versions):
+    upload_and_publish(client, owner, versions["1.0.0"], release_blob(0))
+    upload_and_publish(client, owner, versions["1.1.0"], release_blob(1))
+    upload_and_publish(client, owner, versions["1.2.0"], release_blob(2))
+    old_patch = patches(db, versions["1.1.0"])[versions["1.0.0"]].sha256
+    # 1.1.0 is re-uploaded with different bytes after it was published
+    replacement = release_blob(5)
+    assert client.put(f"/api/versions/{versions['1.1.0']}/artifact", content=replacement,
+                      headers=auth(owner)).status_code == 200
+    into = patches(db, versions["1.1.0"])
+    assert into[versions["1.0.0"]].sha256 != old_patch
+    r = client.get("/api/versions/foo/latest?platform=android&from=1.0.0")
+    assert r.json()["semver"] == "1.2.0"
+    for semver, blob in (("1.0.0", release_blob(0)), ("1.1.0", replacement)):
+        patch = patches(db, versions["1.2.0"])[versions[semver]]
+        data = client.get(f"/api/versions/{versions['1.2.0']}/patches/{versions[semver]}").content
+        assert hashlib.sha256(data).hexdigest() == patch.sha256
+        assert bsdiff4.patch(blob, data) == release_blob(2)
+    data = client.get(f"/api/versions/{versions['1.1.0']}/patches/{versions['1.0.0']}").content
+    assert hashlib.sha256(bsdiff4.patch(release_blob(0), data)).hexdigest() == \
+        db.get(Version, versions["1.1.0"]).file_sha256
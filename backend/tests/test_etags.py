@@ -0,0 +1,64 @@
+from app.models import App, Version
+from factories import add_app, add_developer
+import pytest
+
+IDENTITY = {"Accept-Encoding": "identity"}
+
+@pytest.fixture
+def app_(db):
+    return add_app(db, "foo", add_developer(db), "1.0.0")
+
+def get(client, url, etag=None):
+    headers = dict(IDENTITY, **({"If-None-Match": etag} if etag else {}))
+    return client.get(url, headers=headers)
+
+@pytest.mark.parametrize("url", ["/api/apps", "/api/apps/foo",
+                                 "/api/versions/foo/latest?platform=android"])
+def test_matching_if_none_match_is_304_without_body(client, app_, url):
+    r = get(client, url)
+    assert r.status_code == 200
+    etag = r.headers["ETag"]
+    for header in (etag, "W/" + etag, f'"other", {etag}', "*"):
+        r = get(client, url, header)
+        assert r.status_code == 304
+        assert r.content == b""
+        assert r.headers["ETag"] == etag
+    assert get(client, url, '"other"').status_code == 200
+
+def test_list_etag_follows_the_catalog_revision(client, db, app_):
+    etag = get(client, "/api/apps").headers["ETag"]
+    assert get(client, "/api/apps?limit=10").headers["ETag"] != etag
+    add_app(db, "bar", add_developer(db, "other@example.com"))
+    r = get(client, "/api/apps", etag)
+    assert r.status_code == 200
+    assert r.headers["ETag"] != etag
+    assert [a["slug"] for a in r.json()["items"]] == ["foo", "bar"]
+
+def test_detail_etag_follows_the_app(client, db, app_):
+    etag = get(client, "/api/apps/foo").headers["ETag"]
+    db.get(App, app_.id).name = "Renamed"
+    db.commit()
+    r = get(client, "/api/apps/foo", etag)
+    assert r.status_code == 200
+    assert r.json()["name"] == "Renamed"
+
+def test_latest_etag_follows_the_release(client, db, app_):
+    url = "/api/versions/foo/latest?platform=android"
+    etag = get(client, url).headers["ETag"]
+    db.add(Version(app_id=app_.id, semver="1.1.0", platform="android", file_url="",
+                   file_sha256="", release_notes="", published=True))
+    db.commit()
+    r = get(client, url, etag)
+    assert r.status_code == 200
+    assert r.json()["semver"] == "1.1.0"
+    etag = r.headers["ETag"]
+    # release notes are edited in place; the ETag still has to move
+    version = db.query(Version).filter_by(semver="1.1.0").one()
+    version.release_notes = "fixed typo"
+    db.commit()
+    assert get(client, url, etag).status_code == 200
+
+def test_errors_carry_no_etag(client):
+    r = get(client, "/api/versions/missing/latest?platform=android")
+    assert r.json() == {"error": "not_found"}
+    assert "ETag" not in r.headers
@@ -0,0 +1,77 @@
+from sqlalchemy import inspect, select, text
+from app import catalog_index, snapshots
+from app.catalog_index import CatalogIndex
+from app.db import engine
+from app.importer import import_catalog, main, read_rows
+from app.models import App, CatalogRevision, User, Version
+import json
+import os
+import pytest
+
+@pytest.fixture
+def files(tmp_path):
+    (tmp_path / "users.csv").write_text(
+        "id,email,role,password_hash\n1,a@example.com,developer,x\n2,b@example.com,developer,x\n")
+    (tmp_path / "apps.ndjson").write_text("\n".join(json.dumps(row) for row in (
+        {"id": 1, "slug": "notes", "name": "Notes", "description": "write", "developer_id": 1},
+        {"id": "2", "slug": "maps", "name": "Maps", "description": "navigate", "developer_id": "2",
+         "unknown_column": "ignored"},
+    )) + "\n\n")
+    (tmp_path / "versions.csv").write_text(
+        "app_slug,semver,platform,file_url,file_sha256,release_notes,published\n"
+        "notes,1.0.0,android,,,,true\n"
+        "notes,1.10.0-rc.2,android,,,,yes\n"
+        "notes,2.0.0,android,,,,0\n"
+        "maps,0.9.0,ios,,,,1\n")
+    return tmp_path
+
+def sources(path):
+    return [("users", read_rows(str(path / "users.csv"))),
+            ("apps", read_rows(str(path / "apps.ndjson"))),
+            ("versions", read_rows(str(path / "versions.csv")))]
+
+def test_import_coerces_and_resolves_slugs(db, files):
+    assert import_catalog(engine, sources(files), batch_size=2) == {"users": 2, "apps": 2, "versions": 4}
+    assert db.scalars(select(User.email).order_by(User.id)).all() == ["a@example.com", "b@example.com"]
+    assert db.get(App, 2).developer_id == 2
+    rows = db.execute(select(Version.semver, Version.app_id, Version.published, Version.minor,
+                             Version.is_release).order_by(Version.id)).all()
+    assert rows == [("1.0.0", 1, True, 0, True), ("1.10.0-rc.2", 1, True, 10, False),
+                    ("2.0.0", 1, False, 0, True), ("0.9.0", 2, True, 9, True)]
+
+def test_import_restores_indexes_and_triggers(client, db, files):
+    import_catalog(engine, sources(files))
+    insp = inspect(engine)
+    assert "ix_versions_latest" in {ix["name"] for ix in insp.get_indexes("versions")}
+    with engine.connect() as conn:
+        triggers = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'trigger'")).scalars())
+    assert triggers == {"apps_fts_ai", "apps_fts_ad", "apps_fts_au"}
+    # loaded rows are searchable, and later writes keep the index in step
+    assert [a["slug"] for a in client.get("/api/apps/search?q=navi").json()] == ["maps"]
+    db.get(App, 2).name = "Atlas"
+    db.commit()
+    assert [a["slug"] for a in client.get("/api/apps/search?q=atlas").json()] == ["maps"]
+    assert client.get("/api/versions/notes/latest?platform=android").json()["semver"] == "1.10.0-rc.2"
+
+def test_import_bumps_the_catalog_revision(db, files):
+    import_catalog(engine, sources(files))
+    # apps and versions each commit their own load
+    assert db.scalar(select(CatalogRevision.value)) == 2
+
+def test_cli_rebuilds_snapshots_and_index(files, tmp_path, monkeypatch, capsys):
+    index_path = str(tmp_path / "catalog.idx")
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", str(tmp_path / "snapshots"))
+    monkeypatch.setattr(catalog_index, "CATALOG_INDEX_PATH", index_path)
+    os.makedirs(tmp_path / "snapshots")
+    main([f"users={files / 'users.csv'}", f"apps={files / 'apps.ndjson'}",
+          f"versions={files / 'versions.csv'}"])
+    with open(tmp_path / "snapshots" / "current" / "apps" / "page-0-50.json") as f:
+        assert [a["slug"] for a in json.load(f)["items"]] == ["notes", "maps"]
+    index = CatalogIndex(index_path, 0)
+    assert index.latest("maps", "ios") is not None
+    assert index.revision == 2
+    assert "catalog index: r2" in capsys.readouterr().out
+
+def test_cli_rejects_unknown_tables(files):
+    with pytest.raises(SystemExit):
+        main([f"nope={files / 'users.csv'}"])
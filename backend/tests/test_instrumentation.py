@@ -0,0 +1,53 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select, text
+from app import db as db_module
+from app.db import AsyncSessionLocal, _param_shape
+from app.middleware import SQLTimingMiddleware
+from app.models import User
+import logging
+import re
+
+def timed_app(server_timing: bool):
+    api = FastAPI()
+
+    @api.get("/users")
+    async def users():
+        async with AsyncSessionLocal() as db:
+            await db.execute(text("SELECT 1"))
+            await db.execute(select(User.id))
+        return {}
+
+    @api.get("/none")
+    async def none():
+        return {}
+
+    return TestClient(SQLTimingMiddleware(api, server_timing=server_timing))
+
+def test_server_timing_reports_queries_with_sql_debug(caplog):
+    caplog.set_level(logging.DEBUG, "app.sql.requests")
+    header = timed_app(True).get("/users").headers["Server-Timing"]
+    assert re.fullmatch(r'db;dur=\d+\.\d;desc="2 queries, slowest \d+\.\dms", app;dur=\d+\.\d', header)
+    assert re.search(r"GET /users: 2 queries, \d+\.\dms, slowest: SELECT", caplog.text)
+
+def test_server_timing_without_queries():
+    header = timed_app(True).get("/none").headers["Server-Timing"]
+    assert header.startswith('db;dur=0.0;desc="0 queries, slowest 0.0ms"')
+
+def test_no_server_timing_by_default():
+    assert "Server-Timing" not in timed_app(False).get("/users").headers
+
+def test_slow_query_log_has_statement_and_parameter_types_only(db, caplog, monkeypatch):
+    monkeypatch.setattr(db_module, "SLOW_QUERY_MS", 0)
+    caplog.set_level(logging.WARNING, "app.sql.slow")
+    db.execute(select(User.id).where(User.email == "secret@example.com")).all()
+    record = caplog.records[-1]
+    assert record.name == "app.sql.slow"
+    message = record.getMessage()
+    assert re.match(r"\d+\.\dms SELECT users\.id FROM users WHERE users\.email = \? params=\(str\)$", message)
+    assert "secret" not in message
+
+def test_param_shape():
+    assert _param_shape({"email": "x", "id": 1}) == "{email: str, id: int}"
+    assert _param_shape([(1, "a"), (2, "b")], executemany=True) == "2 x (int, str)"
+    assert _param_shape([], executemany=True) == "[]"
@@ -0,0 +1,59 @@
+from app.metrics import LATENCY_BUCKETS, Metrics
+from factories import add_app, add_developer
+import re
+
+def scrape(client) -> str:
+    r = client.get("/api/metrics")
+    assert r.status_code == 200
+    assert r.headers["content-type"].startswith("text/plain")
+    return r.text
+
+def sample(text: str, name: str, **labels) -> float:
+    label_re = ",".join(f'{k}="{re.escape(str(v))}"' for k, v in labels.items())
+    label_re = "{%s}" % label_re if labels else ""
+    values = re.findall(rf"^{name}{label_re} (\S+)$", text, re.M)
+    assert len(values) == 1, (name, labels)
+    return float(values[0])
+
+def test_requests_are_labelled_by_route_template(client, db):
+    add_app(db, "foo", add_developer(db), "1.0.0")
+    before = scrape(client)
+    client.get("/api/apps/foo")
+    client.get("/api/apps/foo")
+    text = scrape(client)
+    assert "/api/apps/foo" not in text
+    labels = {"method": "GET", "route": "/api/apps/{slug}", "status": 200}
+    previous = sample(before, "http_requests_total", **labels) if 'route="/api/apps/{slug}"' in before else 0
+    assert sample(text, "http_requests_total", **labels) == previous + 2
+    assert sample(text, "http_request_duration_seconds_count",
+                  method="GET", route="/api/apps/{slug}") >= 2
+
+def test_unmatched_paths_share_one_label(client):
+    client.get("/no/such/path/1")
+    client.get("/no/such/path/2")
+    text = scrape(client)
+    assert "/no/such/path" not in text
+    assert sample(text, "http_requests_total", method="GET", route="<unmatched>", status=404) >= 2
+
+def test_pool_and_cache_gauges_are_exposed(client):
+    text = scrape(client)
+    for engine in ("primary", "primary_async"):
+        assert sample(text, "db_pool_checked_out", engine=engine) >= 0
+    assert "# TYPE response_cache_hits_total counter" in text
+    assert sample(text, "http_requests_in_flight") >= 1
+
+def test_histogram_buckets_are_cumulative():
+    m = Metrics()
+    for seconds in (0.0005, 0.001, 0.003, 0.2, 30):
+        m.observe("GET", "/x", 200, seconds)
+    text = m.render()
+    buckets = {le: sample(text, "http_request_duration_seconds_bucket",
+                          method="GET", route="/x", le=le) for le in (*LATENCY_BUCKETS, "+Inf")}
+    assert buckets[0.001] == 2          # le is inclusive
+    assert buckets[0.005] == 3
+    assert buckets[0.25] == 4
+    assert buckets[10.0] == 4
+    assert buckets["+Inf"] == 5
+    assert list(buckets.values()) == sorted(buckets.values())
+    assert sample(text, "http_request_duration_seconds_count", method="GET", route="/x") == 5
+    assert abs(sample(text, "http_request_duration_seconds_sum", method="GET", route="/x") - 30.2045) < 1e-6
@@ -0,0 +1,50 @@
+from contextlib import contextmanager
+from sqlalchemy import event
+from app.db import async_engine
+from app.models import App, User
+import pytest
+
+@contextmanager
+def count_queries():
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+
+@pytest.fixture
+def catalog(db):
+    # one developer per app, so a lazy load would cost one query per row
+    users = [User(id=i + 1, email=f"dev{i}@example.com", role="developer", password_hash="x")
+             for i in range(600)]
+    db.add_all(users)
+    db.add_all(App(slug=f"app-{i:03d}", name=f"App {i}", description="d", developer_id=i + 1)
+               for i in range(600))
+    db.commit()
+
+@pytest.mark.parametrize("limit", [3, 500])
+def test_list_apps_query_count_is_independent_of_page_size(client, catalog, limit):
+    with count_queries() as statements:
+        r = client.get(f"/api/apps?limit={limit}")
+    assert r.status_code == 200
+    assert len(r.json()["items"]) == limit
+    # the catalog revision (for the ETag) and the page itself
+    assert len(statements) == 2
+
+def test_app_detail_loads_developer_in_the_same_query(client, catalog):
+    for slug in ("app-000", "app-599"):
+        with count_queries() as statements:
+            r = client.get(f"/api/apps/{slug}")
+        assert r.status_code == 200
+        # the cache's catalog revision check runs at most once a second, not per request
+        statements = [s for s in statements if "catalog_revision" not in s]
+        assert len(statements) == 1
+        assert "JOIN users" in statements[0]
+
+def test_app_detail_does_not_expose_developer_email(client, catalog):
+    body = client.get("/api/apps/app-000").json()
+    assert body["developer"] == {"id": body["developer_id"]}
+    assert "dev0@example.com" not in client.get("/api/apps/app-000").text
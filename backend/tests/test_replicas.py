@@ -0,0 +1,65 @@
+from sqlalchemy import create_engine, select, text
+from sqlalchemy.orm import Session
+from app import db as db_module
+from app.db import PIN_COOKIE, READ_YOUR_WRITES_SECONDS, ReplicaSet, _create_async_engine, async_engine
+from app.models import Base, Version
+from factories import add_app, add_developer, auth
+import pytest
+import time
+
+@pytest.mark.anyio
+async def test_failed_replica_leaves_rotation(tmp_path):
+    good = _create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    bad = _create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/missing/replica.db")
+    replicas = ReplicaSet([good, bad], async_engine)
+    assert {replicas.pick(), replicas.pick()} == {good, bad}
+    with pytest.raises(Exception):
+        async with bad.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+    assert {replicas.pick() for _ in range(4)} == {good}
+    await good.dispose()
+    await bad.dispose()
+
+def test_all_replicas_down_falls_back_to_primary():
+    replicas = ReplicaSet([], async_engine)
+    assert replicas.pick() is async_engine
+
+@pytest.fixture
+def replica(tmp_path, monkeypatch):
+    # a replica that lags: it has the app but not the release published on the primary
+    url = f"sqlite:///{tmp_path}/replica.db"
+    with Session(create_engine(url)) as session:
+        Base.metadata.create_all(session.bind)
+        add_app(session, "foo", add_developer(session), "1.0.0")
+    engine = _create_async_engine("sqlite+aiosqlite" + url[len("sqlite"):])
+    monkeypatch.setattr(db_module, "async_replicas", ReplicaSet([engine], async_engine))
+    yield
+    engine.sync_engine.dispose()
+
+def check(client, cookies=None):
+    client.cookies.clear()
+    for name, value in (cookies or {}).items():
+        client.cookies.set(name, value)
+    r = client.post("/api/versions/check", json={"installed": [
+        {"slug": "foo", "platform": "android", "semver": "1.0.0"}]})
+    return [u["semver"] for u in r.json()]
+
+def test_pin_cookie_routes_reads_to_the_primary(client, db, replica):
+    add_app(db, "foo", add_developer(db), "1.0.0", "1.1.0")
+    assert check(client) == []
+    assert check(client, {PIN_COOKIE: str(int(time.time()) + READ_YOUR_WRITES_SECONDS)}) == ["1.1.0"]
+    assert check(client, {PIN_COOKIE: str(int(time.time()) - 1)}) == []
+    assert check(client, {PIN_COOKIE: "soon"}) == []
+
+def test_forged_far_future_pin_is_ignored(client, db, replica):
+    add_app(db, "foo", add_developer(db), "1.0.0", "1.1.0")
+    assert check(client, {PIN_COOKIE: "99999999999"}) == []
+
+def test_write_sets_a_short_pin(client, db):
+    owner = add_developer(db)
+    app_ = add_app(db, "foo", owner, "1.0.0", published=False)
+    version_id = db.scalar(select(Version.id).where(Version.app_id == app_.id))
+    client.put(f"/api/versions/{version_id}/artifact", content=b"x", headers=auth(owner))
+    pin = client.cookies.get(PIN_COOKIE)
+    assert pin is not None
+    assert time.time() < float(pin) <= time.time() + READ_YOUR_WRITES_SECONDS
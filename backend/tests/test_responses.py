@@ -0,0 +1,59 @@
+from datetime import timedelta
+from pydantic import BaseModel, ConfigDict, Field, computed_field, field_serializer
+from app.responses import _encoder, dumps
+import orjson
+import pytest
+
+class Plain(BaseModel):
+    id: int
+    name: str
+
+class Excluded(BaseModel):
+    id: int
+    secret: str = Field(exclude=True)
+
+class Aliased(BaseModel):
+    id: int = Field(serialization_alias="appId")
+
+class Serialized(BaseModel):
+    name: str
+
+    @field_serializer("name")
+    def upper(self, name):
+        return name.upper()
+
+class Computed(BaseModel):
+    id: int
+
+    @computed_field
+    @property
+    def url(self) -> str:
+        return f"/apps/{self.id}"
+
+class Extra(BaseModel):
+    model_config = ConfigDict(extra="allow")
+    id: int
+
+class Duration(BaseModel):
+    model_config = ConfigDict(ser_json_timedelta="float")
+    took: timedelta
+
+class Page(BaseModel):
+    items: list[Excluded]
+
+@pytest.mark.parametrize("obj", [
+    Plain(id=1, name="foo"),
+    Excluded(id=1, secret="hunter2"),
+    Aliased(id=1),
+    Serialized(name="foo"),
+    Computed(id=1),
+    Extra(id=1, note="kept"),
+    Duration(took=timedelta(seconds=1.5)),
+    Page(items=[Excluded(id=1, secret="hunter2")]),
+])
+def test_matches_model_dump(obj):
+    assert orjson.loads(dumps(obj)) == obj.model_dump(mode="json")
+
+def test_plain_models_skip_model_dump():
+    assert _encoder(Plain) is vars
+    assert _encoder(Excluded) is not vars
@@ -0,0 +1,73 @@
+from app.models import App
+from app.db import engine
+from app.search import match_expression, upgrade_search_index
+from factories import add_app, add_developer
+import pytest
+
+@pytest.fixture
+def apps(db):
+    dev = add_developer(db)
+    for slug, name, description in (("notes", "Notepad", "write things down"),
+                                    ("weather", "Weather Now", "forecasts and notes on rain"),
+                                    ("maps", "Maps", "offline navigation")):
+        app_ = add_app(db, slug, dev)
+        app_.name, app_.description = name, description
+    db.commit()
+
+def search(client, q, **params):
+    r = client.get("/api/apps/search", params={"q": q, **params})
+    assert r.status_code == 200
+    return [a["slug"] for a in r.json()]
+
+def test_prefix_terms_match_as_typed(client, apps):
+    assert search(client, "navi") == ["maps"]
+    assert search(client, "wea no") == ["weather"]
+
+def test_name_hits_rank_above_description_hits(client, apps):
+    assert search(client, "note") == ["notes", "weather"]
+
+def test_index_follows_updates_and_deletes(client, db, apps):
+    app_ = db.query(App).filter_by(slug="maps").one()
+    app_.name = "Atlas"
+    db.commit()
+    assert search(client, "atlas") == ["maps"]
+    db.delete(app_)
+    db.commit()
+    assert search(client, "atlas") == []
+
+def test_punctuation_is_not_query_syntax(client, apps):
+    assert search(client, '"note*') == ["notes", "weather"]
+    assert search(client, "-rain") == ["weather"]
+    assert search(client, "!!!") == []
+
+def test_limit_and_validation(client, apps):
+    assert len(search(client, "n", limit=1)) == 1
+    assert client.get("/api/apps/search", params={"q": ""}).status_code == 422
+    assert client.get("/api/apps/search", params={"q": "x", "limit": 101}).status_code == 422
+
+def test_match_expression():
+    assert match_expression("Foo bar", "sqlite") == '"foo"* "bar"*'
+    assert match_expression("Foo bar", "mysql") == "+foo* +bar*"
+    assert match_expression("--", "sqlite") is None
+
+def test_upgrade_creates_the_index_on_an_existing_database(client, db, apps):
+    with engine.begin() as conn:
+        for name in ("apps_fts_ai", "apps_fts_ad", "apps_fts_au"):
+            conn.exec_driver_sql(f"DROP TRIGGER {name}")
+        conn.exec_driver_sql("DROP TABLE apps_fts")
+    with engine.begin() as conn:
+        assert upgrade_search_index(conn)
+    assert search(client, "navi") == ["maps"]
+    add_app(db, "radio", add_developer(db, "other@example.com"), "1.0.0")
+    assert search(client, "radio") == ["radio"]
+    with engine.begin() as conn:
+        assert not upgrade_search_index(conn)
+
+def test_upgrade_restores_missing_triggers(client, db, apps):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TRIGGER apps_fts_au")
+        assert upgrade_search_index(conn)
+    app_ = db.query(App).filter_by(slug="maps").one()
+    app_.name = "Atlas"
+    db.commit()
+    assert search(client, "atlas") == ["maps"]
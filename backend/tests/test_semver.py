@@ -0,0 +1,47 @@
+from sqlalchemy import text
+from app import semver as sv
+from app.backfill import backfill
+from app.db import engine
+from app.models import Version
+from factories import add_app, add_developer
+import itertools
+
+IDENTIFIERS = ["0", "1", "2", "9", "10", "11", "alpha", "beta", "rc", "RC", "a-b", "alpha1"]
+
+def test_prerelease_key_orders_like_semver_precedence():
+    pres = [None] + [".".join(p) for n in (1, 2) for p in itertools.product(IDENTIFIERS, repeat=n)]
+    versions = ["1.0.0" if p is None else f"1.0.0-{p}" for p in pres]
+    by_key = sorted(versions, key=lambda v: (sv.parse(v)[3] is None, sv.prerelease_key(sv.parse(v)[3])))
+    assert by_key == sorted(versions, key=sv.sort_key)
+
+def test_latest_prefers_rc10_over_rc9(client, db):
+    add_app(db, "foo", add_developer(db), "1.9.0", "2.0.0-rc.9", "2.0.0-rc.10", "2.0.0-beta.11")
+    assert client.get("/api/versions/foo/latest?platform=android").json()["semver"] == "2.0.0-rc.10"
+
+def test_check_offers_rc10_to_rc9(client, db):
+    add_app(db, "foo", add_developer(db), "2.0.0-rc.9", "2.0.0-rc.10")
+    r = client.post("/api/versions/check", json={"installed": [
+        {"slug": "foo", "platform": "android", "semver": "2.0.0-rc.9"}]})
+    assert [u["semver"] for u in r.json()] == ["2.0.0-rc.10"]
+
+def test_final_release_outranks_its_prereleases(client, db):
+    add_app(db, "foo", add_developer(db), "2.0.0-rc.10", "2.0.0", "2.0.0-rc.11")
+    assert client.get("/api/versions/foo/latest?platform=android").json()["semver"] == "2.0.0"
+
+def test_backfill_upgrades_a_table_without_parsed_columns(client, db):
+    add_app(db, "foo", add_developer(db), "2.0.0-rc.9", "2.0.0-rc.10", "1.9.0")
+    # rebuild versions the way it looked before the parsed columns existed
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_versions_latest")
+        for column in ("major", "minor", "patch", "is_release", "prerelease_key"):
+            conn.exec_driver_sql(f"ALTER TABLE versions DROP COLUMN {column}")
+    assert backfill(engine) == (3, 0)
+    assert backfill(engine) == (0, 0)
+    db.expire_all()
+    assert {v.semver: v.prerelease_key for v in db.query(Version)} == {
+        "2.0.0-rc.9": sv.prerelease_key("rc.9"), "2.0.0-rc.10": sv.prerelease_key("rc.10"),
+        "1.9.0": ""}
+    with engine.connect() as conn:
+        indexed = conn.execute(text("PRAGMA index_info(ix_versions_latest)")).all()
+    assert "prerelease_key" in [row.name for row in indexed]
+    assert client.get("/api/versions/foo/latest?platform=android").json()["semver"] == "2.0.0-rc.10"
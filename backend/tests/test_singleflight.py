@@ -0,0 +1,63 @@
+from app.routes import versions
+from app.singleflight import SingleFlight
+from factories import add_app, add_developer
+import asyncio
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+async def test_concurrent_calls_share_one_task():
+    flights, calls = SingleFlight(), 0
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "value"
+    results = await asyncio.gather(*(flights.do("k", fetch, 1) for _ in range(10)))
+    assert results == ["value"] * 10
+    assert (calls, flights.started, flights.coalesced) == (1, 1, 9)
+    assert flights._calls == {}
+
+async def test_different_keys_do_not_coalesce():
+    flights = SingleFlight()
+    async def fetch():
+        await asyncio.sleep(0.01)
+    await asyncio.gather(flights.do("a", fetch, 1), flights.do("b", fetch, 1))
+    assert (flights.started, flights.coalesced) == (2, 0)
+
+async def test_timed_out_caller_does_not_cancel_the_flight():
+    flights, release = SingleFlight(), asyncio.Event()
+    async def fetch():
+        await release.wait()
+        return "value"
+    impatient = asyncio.ensure_future(flights.do("k", fetch, 0.01))
+    patient = asyncio.ensure_future(flights.do("k", fetch, 5))
+    with pytest.raises(asyncio.TimeoutError):
+        await impatient
+    release.set()
+    assert await patient == "value"
+    assert flights.started == 1
+
+async def test_exception_reaches_every_waiter_and_clears_the_key():
+    flights = SingleFlight()
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("db down")
+    results = await asyncio.gather(*(flights.do("k", fail, 1) for _ in range(3)),
+                                   return_exceptions=True)
+    assert [str(r) for r in results] == ["db down"] * 3
+    assert flights._calls == {}
+    async def ok():
+        return "recovered"
+    assert await flights.do("k", ok, 1) == "recovered"
+    assert flights.started == 2
+
+def test_latest_lookup_timeout_is_503(client, db, monkeypatch):
+    add_app(db, "foo", add_developer(db), "1.0.0")
+    async def slow(key, bind):
+        await asyncio.sleep(0.2)
+    monkeypatch.setattr(versions, "_fill_latest", slow)
+    monkeypatch.setattr(versions, "SINGLEFLIGHT_TIMEOUT", 0.01)
+    r = client.get("/api/versions/foo/latest?platform=android")
+    assert r.status_code == 503
+    assert r.headers["Retry-After"] == "1"
@@ -0,0 +1,63 @@
+from app.models import Version
+from app.snapshots import RebuildScheduler, build_snapshot, update_apps
+from factories import add_app, add_developer
+import brotli
+import json
+import os
+import pytest
+
+def read(snapshot_dir, relpath):
+    with open(os.path.join(snapshot_dir, "current", relpath)) as f:
+        return json.load(f)
+
+def publish(db, app_, semver):
+    db.add(Version(app_id=app_.id, semver=semver, platform="android", file_url="",
+                   file_sha256="", release_notes="", published=True))
+    db.commit()
+
+@pytest.fixture
+def apps(db):
+    dev = add_developer(db)
+    return [add_app(db, f"app-{i}", dev, "1.0.0") for i in range(3)]
+
+def test_full_build_renders_pages_and_latest(tmp_path, apps):
+    build_snapshot(str(tmp_path))
+    page = read(tmp_path, "apps/page-0-50.json")
+    assert [a["slug"] for a in page["items"]] == ["app-0", "app-1", "app-2"]
+    assert read(tmp_path, "versions/app-1/latest/android.json")["semver"] == "1.0.0"
+    br = os.path.join(tmp_path, "current", "versions/app-1/latest/android.json.br")
+    with open(br, "rb") as f:
+        assert json.loads(brotli.decompress(f.read()))["semver"] == "1.0.0"
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".tmp")]
+
+def test_publish_rewrites_only_that_app_in_place(tmp_path, db, apps):
+    root = build_snapshot(str(tmp_path))
+    untouched = os.path.join(root, "versions/app-2/latest/android.json")
+    before = os.stat(untouched).st_mtime_ns
+    publish(db, apps[1], "1.1.0")
+    assert update_apps({apps[1].id}, str(tmp_path)) == 1
+    assert os.path.realpath(os.path.join(tmp_path, "current")) == root
+    assert read(tmp_path, "versions/app-1/latest/android.json")["semver"] == "1.1.0"
+    assert os.stat(untouched).st_mtime_ns == before
+    leftovers = [n for _, _, files in os.walk(root) for n in files if n.endswith(".tmp")]
+    assert leftovers == []
+
+def test_update_without_a_snapshot_leaves_the_full_build_to_the_cli(tmp_path, apps):
+    assert update_apps({apps[0].id}, str(tmp_path)) == 0
+    assert os.listdir(tmp_path) == []
+
+def test_old_releases_are_pruned(tmp_path, apps):
+    roots = [build_snapshot(str(tmp_path)) for _ in range(3)]
+    assert sorted(os.listdir(tmp_path / "releases")) == sorted(os.path.basename(r) for r in roots[1:])
+
+@pytest.mark.anyio
+async def test_scheduler_batches_keys_and_full_builds_win():
+    calls = []
+    scheduler = RebuildScheduler(0.01, lambda: calls.append("full"), lambda keys: calls.append(keys))
+    scheduler.schedule(1)
+    scheduler.schedule(2)
+    await scheduler._task
+    scheduler.schedule(3)
+    scheduler.schedule()
+    await scheduler._task
+    assert calls == [{1, 2}, "full"]
@@ -0,0 +1,112 @@
+from fastapi.testclient import TestClient
+from sqlalchemy import select
+from app.db import _create_async_engine
+from app.main import app
+from app.models import Version, VersionStat
+from app.schemas import TelemetryEvent
+from app.telemetry import TelemetryAggregator, telemetry
+from factories import add_app, add_developer, auth
+import pytest
+import time
+
+@pytest.fixture
+def owner(db):
+    return add_developer(db, "owner@example.com")
+
+@pytest.fixture
+def version_id(db, owner):
+    app_ = add_app(db, "foo", owner, "1.0.0")
+    return db.scalar(select(Version.id).where(Version.app_id == app_.id))
+
+def send(version_id, *events):
+    # leaving the client runs the lifespan shutdown, which flushes
+    with TestClient(app) as client:
+        return [client.post("/api/telemetry", json={"events": [
+            {"version_id": version_id, "event": event, "ts": ts} for event, ts in batch]})
+            for batch in events]
+
+def test_events_are_aggregated_per_minute(db, version_id):
+    minute = int(time.time()) // 60 * 60
+    responses = send(version_id, [("download", minute), ("download", minute + 1)],
+                     [("install", minute + 2), ("download", minute - 60)])
+    assert [r.status_code for r in responses] == [202, 202]
+    assert [r.json() for r in responses] == [{"accepted": 2}, {"accepted": 2}]
+    rows = db.execute(select(VersionStat.event_type, VersionStat.minute, VersionStat.count)
+                      .order_by(VersionStat.minute, VersionStat.event_type)).all()
+    assert rows == [("download", minute // 60 - 1, 1), ("download", minute // 60, 2),
+                    ("install", minute // 60, 1)]
+
+def test_flushes_add_to_existing_counts(db, version_id):
+    minute = int(time.time()) // 60 * 60
+    send(version_id, [("download", minute)])
+    send(version_id, [("download", minute)])
+    assert db.scalar(select(VersionStat.count)) == 2
+
+def test_implausible_client_clock_uses_server_time(db, version_id):
+    send(version_id, [("install", 0), ("install", 2 ** 40)])
+    assert db.scalar(select(VersionStat.minute)) >= int(time.time()) // 60 - 1
+
+def test_stats_are_for_the_owner_only(db, owner, version_id):
+    now = int(time.time())
+    send(version_id, [("download", now), ("download", now), ("install", now - 3600)])
+    with TestClient(app) as client:
+        url = f"/api/versions/{version_id}/stats"
+        assert client.get(url, headers=auth(owner)).json() == {
+            "version_id": version_id, "counts": {"download": 2, "install": 1}}
+        assert client.get(url, params={"since": now - 60}, headers=auth(owner)).json()["counts"] == {
+            "download": 2, "install": 0}
+        other = add_developer(db, "other@example.com")
+        assert client.get(url, headers=auth(other)).status_code == 403
+        assert client.get(url).status_code == 401
+
+def test_full_backlog_is_refused_with_retry_after(version_id, monkeypatch):
+    monkeypatch.setattr(telemetry, "max_keys", 1)
+    first, second = send(version_id, [("download", None)], [("install", None)])
+    assert first.status_code == 202
+    assert second.status_code == 503
+    assert second.headers["Retry-After"] == "2"
+
+def test_invalid_events_are_rejected(client):
+    assert client.post("/api/telemetry", json={"events": [
+        {"version_id": 1, "event": "uninstall"}]}).status_code == 422
+    # outside the INT column, where MySQL would refuse the whole flush
+    for version_id in (0, -1, 2 ** 31, 2 ** 63):
+        assert client.post("/api/telemetry", json={"events": [
+            {"version_id": version_id, "event": "install"}]}).status_code == 422
+    assert client.post("/api/telemetry", json={"events": [
+        {"version_id": 1, "event": "install"}] * 1001}).status_code == 422
+
+def test_unknown_versions_are_dropped_at_flush(db, version_id):
+    unknown = telemetry.unknown
+    send(version_id, [("download", None)])
+    send(version_id + 1000, [("download", None), ("install", None)])
+    assert db.execute(select(VersionStat.version_id, VersionStat.count)).all() == [(version_id, 1)]
+    assert telemetry.unknown - unknown == 2
+
+def test_rejected_rows_do_not_block_the_rest(db, owner, version_id, engine_conn):
+    app_ = add_app(db, "bar", owner, *(f"1.0.{i}" for i in range(5)))
+    ids = db.scalars(select(Version.id).where(Version.app_id == app_.id)).all()
+    rejected = ids[3]
+    engine_conn("CREATE TRIGGER reject_one BEFORE INSERT ON version_stats "
+                f"WHEN NEW.version_id = {rejected} BEGIN SELECT RAISE(ABORT, 'rejected'); END")
+    dropped = telemetry.dropped
+    with TestClient(app) as client:
+        client.post("/api/telemetry", json={"events": [
+            {"version_id": v, "event": "download"} for v in [version_id, *ids]]})
+    assert sorted(db.scalars(select(VersionStat.version_id))) == sorted(
+        v for v in [version_id, *ids] if v != rejected)
+    assert telemetry.dropped - dropped == 1
+    assert not telemetry._counts
+
+@pytest.mark.anyio
+async def test_failed_flush_keeps_the_counters(tmp_path):
+    # no version_stats table in this database, so every flush fails
+    engine = _create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/empty.db")
+    aggregator = TelemetryAggregator(engine, flush_interval=60, flush_keys=100, max_keys=2)
+    aggregator.add([TelemetryEvent(version_id=1, event="download"),
+                    TelemetryEvent(version_id=2, event="download")])
+    await aggregator.flush()
+    assert aggregator.flush_errors == 1
+    assert sum(aggregator._counts.values()) == 2
+    await aggregator.close()
+    await engine.dispose()